@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Book, BookPage, Favorite
+from .models import Book, BookPage, Favorite, ProcessingJob
+from .jobs import retry_job
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
@@ -17,3 +18,15 @@ class BookPageAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['user', 'book', 'created_at']
     list_filter = ['created_at']
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ['book', 'status', 'processed_pages', 'total_pages', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['processed_pages', 'total_pages', 'attempts', 'error', 'created_at', 'started_at', 'finished_at', 'updated_at']
+    actions = ['retry_jobs']
+    
+    @admin.action(description='Proses ulang job yang dipilih')
+    def retry_jobs(self, request, queryset):
+        for job in queryset.exclude(status=ProcessingJob.STATUS_RUNNING):
+            retry_job(job)
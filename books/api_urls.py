@@ -0,0 +1,12 @@
+from django.urls import path
+from . import api_views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('books/', api_views.books_view, name='books'),
+    path('books/<int:book_id>/', api_views.book_view, name='book'),
+    path('books/<int:book_id>/pages/', api_views.pages_view, name='pages'),
+    path('favorites/', api_views.favorites_view, name='favorites'),
+    path('search/', api_views.search_view, name='search'),
+]
@@ -0,0 +1,234 @@
+"""
+Read-only JSON API for books, pages, favorites and search.
+
+Responses are built from ``.values()`` rows, never model instances, and
+only the columns behind the requested ``fields`` are read. Lists are
+paginated with cursors: book lists reuse the catalog's keyset pagination
+(``books.pagination``), pages and search results continue after a page
+number or a rank. ``ids`` (and ``numbers`` for pages) fetch many objects
+in one call. Authentication is the site's session.
+"""
+from functools import wraps
+
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+from .favorites import get_favorite_book_ids
+from .models import Book, BookPage, Favorite
+from .pagination import get_cached_count, paginate_keyset
+from .search import search_books
+from .serializers import BOOK_FIELDS, PAGE_FIELDS, get_book_columns, get_page_columns, serialize_book, serialize_page
+
+DEFAULT_BOOK_FIELDS = ('id', 'title', 'author', 'year', 'genre', 'cover_url', 'page_count')
+
+DEFAULT_LIMIT = 20
+
+MAX_LIMIT = 100
+
+# Most ids (or page numbers) accepted by one batched lookup.
+MAX_BATCH_SIZE = 100
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """
+    Answer anonymous requests with 401 instead of a login redirect, allow
+    only GET and HEAD and turn ``ApiError`` into a JSON error response.
+    """
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Login diperlukan.'}, status=401)
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+    return wrapper
+
+
+def parse_fields(request, allowed, default):
+    """
+    The fields named in ``?fields=a,b``, in that order, or ``default``.
+    """
+    value = request.GET.get('fields')
+    if not value:
+        return list(default)
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f"Field tidak dikenal: {', '.join(unknown)}")
+    return fields
+
+
+def parse_int_list(request, name):
+    """
+    The integers of ``?name=1,2,3`` in the given order, or ``None``.
+    """
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    try:
+        numbers = list(dict.fromkeys(int(item) for item in value.split(',') if item.strip()))
+    except ValueError:
+        raise ApiError(f"{name} harus berupa daftar angka.")
+    if len(numbers) > MAX_BATCH_SIZE:
+        raise ApiError(f"Paling banyak {MAX_BATCH_SIZE} {name} per permintaan.")
+    return numbers
+
+
+def parse_int(request, name, default=None, minimum=0, maximum=None):
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ApiError(f"{name} harus berupa angka.")
+    if number < minimum:
+        raise ApiError(f"{name} paling kecil {minimum}.")
+    return min(number, maximum) if maximum is not None else number
+
+
+def annotate_favorites(request, books, fields):
+    if 'is_favorite' in fields:
+        books = books.annotate(
+            is_favorite=Exists(Favorite.objects.filter(user=request.user, book=OuterRef('pk'))),
+        )
+    return books
+
+
+def get_books_by_id(request, book_ids, fields):
+    """
+    The books with ``book_ids`` in one query, as a dict by id. Unknown ids
+    are left out.
+    """
+    books = annotate_favorites(request, Book.objects.filter(id__in=book_ids), fields)
+    return {row['id']: serialize_book(row, fields) for row in books.values(*get_book_columns(fields))}
+
+
+def book_list_response(request, books, fields, count_key):
+    """
+    One keyset page of ``books`` newest first, following ``?after=`` or
+    preceding ``?before=``. ``count_key`` identifies ``books`` for the
+    cached count, as in the catalog.
+    """
+    limit = parse_int(request, 'limit', DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+    genre = request.GET.get('genre')
+    if genre:
+        books = books.filter(genre=genre)
+    count = get_cached_count(books, [genre or '', *count_key])
+    page = paginate_keyset(
+        books.values(*get_book_columns(fields)),
+        limit,
+        count,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return JsonResponse({
+        'count': count,
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+        'results': [serialize_book(row, fields) for row in page],
+    })
+
+
+@api_view
+def books_view(request):
+    """
+    Books newest first, or the books listed in ``?ids=`` in that order.
+    """
+    fields = parse_fields(request, BOOK_FIELDS, DEFAULT_BOOK_FIELDS)
+    book_ids = parse_int_list(request, 'ids')
+    if book_ids is not None:
+        books = get_books_by_id(request, book_ids, fields)
+        return JsonResponse({'results': [books[book_id] for book_id in book_ids if book_id in books]})
+    books = annotate_favorites(request, Book.objects.all(), fields)
+    return book_list_response(request, books, fields, [''])
+
+
+@api_view
+def book_view(request, book_id):
+    fields = parse_fields(request, BOOK_FIELDS, DEFAULT_BOOK_FIELDS)
+    books = get_books_by_id(request, [book_id], fields)
+    if book_id not in books:
+        raise ApiError('Buku tidak ditemukan.', status=404)
+    return JsonResponse(books[book_id])
+
+
+@api_view
+def pages_view(request, book_id):
+    """
+    Pages of a book in order, continuing after page number ``?after=``, or
+    the pages listed in ``?numbers=``.
+    """
+    fields = parse_fields(request, PAGE_FIELDS, PAGE_FIELDS)
+    pages = BookPage.objects.filter(book_id=book_id).values(*get_page_columns(fields))
+    numbers = parse_int_list(request, 'numbers')
+    if numbers is not None:
+        rows = list(pages.filter(page_number__in=numbers))
+    else:
+        limit = parse_int(request, 'limit', DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+        rows = list(pages.filter(page_number__gt=parse_int(request, 'after', 0)).order_by('page_number')[:limit + 1])
+
+    # Only an empty answer needs a second look at whether the book exists.
+    if not rows and not Book.objects.filter(id=book_id).exists():
+        raise ApiError('Buku tidak ditemukan.', status=404)
+
+    if numbers is not None:
+        by_number = {row['page_number']: row for row in rows}
+        rows = [by_number[number] for number in numbers if number in by_number]
+        next_cursor = None
+    else:
+        next_cursor = rows[limit - 1]['page_number'] if len(rows) > limit else None
+        rows = rows[:limit]
+
+    return JsonResponse({'next': next_cursor, 'results': [serialize_page(book_id, row, fields) for row in rows]})
+
+
+@api_view
+def favorites_view(request):
+    fields = parse_fields(request, BOOK_FIELDS, DEFAULT_BOOK_FIELDS)
+    # The same session-cached ids and counts as the catalog's favorites filter.
+    books = Book.objects.filter(id__in=get_favorite_book_ids(request))
+    if 'is_favorite' in fields:
+        books = books.annotate(is_favorite=Value(True, output_field=BooleanField()))
+    return book_list_response(request, books, fields, [request.user.id])
+
+
+@api_view
+def search_view(request):
+    """
+    Books matching ``?q=`` best first, with their best matching pages,
+    continuing after rank ``?after=``.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        raise ApiError('Parameter q wajib diisi.')
+    fields = parse_fields(request, BOOK_FIELDS, DEFAULT_BOOK_FIELDS)
+    limit = parse_int(request, 'limit', DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+    after = parse_int(request, 'after', 0)
+
+    hits = search_books(query)
+    window = hits[after:after + limit]
+    books = get_books_by_id(request, [hit.book_id for hit in window], fields)
+    results = [
+        {
+            'book': books[hit.book_id],
+            'score': hit.score,
+            'pages': [{'number': page['page_number'], 'snippet': str(page['snippet'])} for page in hit.pages],
+        }
+        for hit in window
+        if hit.book_id in books
+    ]
+    return JsonResponse({
+        'count': len(hits),
+        'next': after + limit if after + limit < len(hits) else None,
+        'results': results,
+    })
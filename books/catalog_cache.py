@@ -0,0 +1,38 @@
+"""
+Versioned keys for cached catalog data.
+
+Rendered catalog rows, book detail fragments and catalog counts are cached
+under keys that include the catalog version. Saving or deleting a ``Book``
+(see ``books.signals``) and the offline builds that change what a book page
+shows bump the version, which retires every cached entry at once without
+tracking individual keys. Stale entries simply expire.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'books:catalog:version'
+
+
+def get_cache_timeout():
+    return getattr(settings, 'BOOK_CATALOG_CACHE_SECONDS', 60 * 60 * 24)
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = bump_catalog_version()
+    return version
+
+
+def bump_catalog_version():
+    # A timestamp rather than an increment, so a version key that was
+    # evicted never comes back with the value of older entries.
+    version = time.time_ns()
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def make_key(*parts):
+    return ':'.join(['books', str(get_catalog_version()), *(str(part) for part in parts)])
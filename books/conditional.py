@@ -0,0 +1,59 @@
+"""
+Conditional GET for the HTML pages of a book.
+
+A page about a book only changes with the book itself (``Book.updated_at``),
+with the catalog version (topics, similar books, see ``books.catalog_cache``)
+and with the visitor's own state shown on it. The ETag covers all of these,
+so a repeat visit is answered with a 304 before any template is rendered.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .catalog_cache import get_catalog_version
+
+
+def get_page_validators(request, book, *state):
+    """
+    Return ``(etag, last_modified)`` of a page about ``book`` showing the
+    extra ``state`` values, or ``None`` when the page has to be rendered
+    anyway because it carries one-time flash messages.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    parts = [
+        book.id,
+        book.updated_at.isoformat(),
+        get_catalog_version(),
+        request.user.pk,
+        # Forms on the page embed a token tied to the CSRF cookie.
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        *state,
+    ]
+    etag = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{etag}"', int(book.updated_at.timestamp())
+
+
+def not_modified(request, validators):
+    """
+    A 304 response when the client's copy matches ``validators``, else ``None``.
+    """
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, validators)
+    return response
+
+
+def set_validators(response, validators):
+    patch_cache_control(response, private=True, no_cache=True)
+    if validators is not None:
+        etag, last_modified = validators
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,28 @@
+"""
+Per-session cache of the current user's favorite book ids.
+
+The catalog's favorites filter needs the ids on every page, so they are read
+once and kept in the session. ``forget_favorite_book_ids()`` must be called
+whenever the user's favorites change.
+"""
+from .models import Book, Favorite
+from .pagination import forget_cached_count
+
+SESSION_KEY = 'favorite_book_ids'
+
+
+def get_favorite_book_ids(request):
+    book_ids = request.session.get(SESSION_KEY)
+    if book_ids is None:
+        book_ids = list(Favorite.objects.filter(user=request.user).values_list('book_id', flat=True))
+        request.session[SESSION_KEY] = book_ids
+    return set(book_ids)
+
+
+def forget_favorite_book_ids(request):
+    """
+    Drop the cached ids and the cached counts of the favorites filter.
+    """
+    request.session.pop(SESSION_KEY, None)
+    for genre in ['', *(choice for choice, _label in Book.GENRE_CHOICES)]:
+        forget_cached_count([genre, request.user.id])
@@ -49,7 +49,7 @@ class SearchForm(forms.Form):
         max_length=200,
         widget=forms.TextInput(attrs={
             'class': 'form-input',
-            'placeholder': 'Cari berdasarkan judul, tahun, atau deskripsi...'
+            'placeholder': 'Cari berdasarkan judul, tahun, deskripsi, atau isi buku...'
         }),
         label=''
     )
@@ -0,0 +1,44 @@
+"""
+Output profiles for rendered page and cover images.
+
+A profile is a plain dict ``{'format': ..., 'quality': ..., 'dpi': ...}`` so
+it can be passed to rendering processes as is. Profiles are configured per
+genre in BOOK_PAGE_IMAGE_PROFILES; the ``default`` entry is used for genres
+without their own profile.
+"""
+from django.conf import settings
+
+FORMAT_EXTENSIONS = {
+    'png': 'png',
+    'jpeg': 'jpg',
+    'webp': 'webp',
+}
+
+DEFAULT_PROFILE = {'format': 'png', 'quality': 100, 'dpi': 72}
+
+
+def get_image_profile(genre=None):
+    """
+    Return the image profile for a genre (see ``Book.GENRE_CHOICES``).
+    """
+    profiles = getattr(settings, 'BOOK_PAGE_IMAGE_PROFILES', {})
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(profiles.get('default', {}))
+    if genre:
+        profile.update(profiles.get(genre, {}))
+
+    if profile['format'] not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported page image format: {profile['format']}")
+    return profile
+
+
+def get_extension(profile):
+    return FORMAT_EXTENSIONS[profile['format']]
+
+
+def get_variant_widths():
+    """
+    Widths in pixels of the page image variants from BOOK_PAGE_VARIANT_WIDTHS,
+    e.g. ``{'thumbnail': 240, 'mobile': 720}``.
+    """
+    return dict(getattr(settings, 'BOOK_PAGE_VARIANT_WIDTHS', {}))
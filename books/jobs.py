@@ -0,0 +1,147 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Book, ProcessingJob
+from .processing import process_pdf_to_images
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_book_processing(book):
+    """
+    Queue a PDF rasterization job for the book.
+
+    A job that is still waiting for a worker or running is reused instead
+    of queueing the same book twice. A running job notices a replaced PDF
+    when it finishes and processes the book again.
+    """
+    job = ProcessingJob.objects.filter(
+        book=book,
+        status__in=[ProcessingJob.STATUS_PENDING, ProcessingJob.STATUS_RUNNING],
+    ).first()
+    if job is None:
+        job = ProcessingJob.objects.create(book=book)
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically take the oldest pending job and mark it as running.
+
+    The conditional UPDATE makes sure two workers never claim the same job.
+    """
+    while True:
+        job = ProcessingJob.objects.filter(status=ProcessingJob.STATUS_PENDING).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+
+        now = timezone.now()
+        claimed = ProcessingJob.objects.filter(pk=job.pk, status=ProcessingJob.STATUS_PENDING).update(
+            status=ProcessingJob.STATUS_RUNNING,
+            started_at=now,
+            updated_at=now,
+            finished_at=None,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def _refresh_job(job):
+    """
+    Reload the job. Returns ``False`` when it is gone, i.e. its book was
+    deleted while the job ran.
+    """
+    try:
+        job.refresh_from_db()
+    except ProcessingJob.DoesNotExist:
+        logger.warning('Processing job %s was deleted with book %s', job.pk, job.book_id)
+        return False
+    return True
+
+
+def run_job(job, render_workers=None):
+    """
+    Process the job's book and record the outcome on the job.
+
+    Failed jobs go back to the queue until BOOK_PROCESSING_MAX_ATTEMPTS is
+    reached, after which they stay failed until retried manually.
+    ``render_workers`` overrides BOOK_RENDER_WORKERS for this job.
+    """
+    max_attempts = getattr(settings, 'BOOK_PROCESSING_MAX_ATTEMPTS', 3)
+
+    last_reported = None
+
+    def report_progress(processed_pages, total_pages):
+        nonlocal last_reported
+        step = max(1, total_pages // 100)
+        if last_reported is None or processed_pages == total_pages or processed_pages - last_reported >= step:
+            last_reported = processed_pages
+            ProcessingJob.objects.filter(pk=job.pk).update(
+                processed_pages=processed_pages,
+                total_pages=total_pages,
+                updated_at=timezone.now(),
+            )
+
+    pdf_name = job.book.pdf_file.name
+    try:
+        process_pdf_to_images(job.book, progress_callback=report_progress, workers=render_workers)
+    except Exception as e:
+        logger.exception('Processing job %s for book %s failed', job.pk, job.book_id)
+        if not _refresh_job(job):
+            return False
+        job.error = str(e)
+        if job.attempts < max_attempts:
+            job.status = ProcessingJob.STATUS_PENDING
+        else:
+            job.status = ProcessingJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+        job.save()
+        return False
+
+    if not _refresh_job(job):
+        return False
+    job.error = ''
+    if Book.objects.filter(pk=job.book_id).exclude(pdf_file=pdf_name).exists():
+        # The PDF was replaced while this job rendered the old one.
+        job.status = ProcessingJob.STATUS_PENDING
+        job.attempts = 0
+    else:
+        job.status = ProcessingJob.STATUS_DONE
+        job.finished_at = timezone.now()
+    job.save()
+    return True
+
+
+def retry_job(job):
+    """
+    Put a failed job back into the queue with a fresh attempt budget.
+    """
+    job.status = ProcessingJob.STATUS_PENDING
+    job.attempts = 0
+    job.processed_pages = 0
+    job.error = ''
+    job.started_at = None
+    job.finished_at = None
+    job.save()
+    return job
+
+
+def requeue_stale_jobs():
+    """
+    Return jobs left running by a crashed worker to the queue.
+
+    A job counts as stale when it has not reported progress for
+    BOOK_PROCESSING_STALE_AFTER seconds.
+    """
+    stale_after = getattr(settings, 'BOOK_PROCESSING_STALE_AFTER', 30 * 60)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return ProcessingJob.objects.filter(
+        status=ProcessingJob.STATUS_RUNNING,
+        updated_at__lt=cutoff,
+    ).update(status=ProcessingJob.STATUS_PENDING)
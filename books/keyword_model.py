@@ -0,0 +1,275 @@
+"""
+Library-wide TF-IDF model for keyword extraction.
+
+Instead of fitting a vectorizer on a single book (where every term has the
+same IDF), the document frequencies of all terms are collected once over the
+whole catalog and stored at BOOK_KEYWORD_MODEL_PATH. Analyzing a book is then
+only a transform of its term counts with the library's IDF, and many books
+can be scored at once with sparse matrix operations.
+
+The model is refreshed incrementally with ``python manage.py
+build_keyword_model``: new books are added to the document frequencies, while
+changed or deleted books are counted as stale and trigger a full refit once
+they exceed BOOK_KEYWORD_MODEL_REFIT_RATIO of the corpus.
+"""
+import os
+import pickle
+import tempfile
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from .models import Book
+from .utils import count_book_terms
+
+MODEL_VERSION = 1
+
+# Keywords must reach this share of the book's L2-normalised TF-IDF vector.
+MIN_SCORE = 0.01
+
+
+class KeywordModel:
+    """
+    Document frequencies of the terms of the library, with the same smoothed
+    IDF as scikit-learn's TfidfVectorizer: ``ln((1 + n) / (1 + df)) + 1``.
+    Terms never seen in the library get the highest IDF.
+    """
+
+    def __init__(self, terms=None, document_frequencies=None, document_total=0, book_versions=None, stale_documents=0):
+        self.terms = list(terms or [])
+        self.vocabulary = {term: index for index, term in enumerate(self.terms)}
+        self.document_frequencies = np.asarray(
+            document_frequencies if document_frequencies is not None else [], dtype=np.int64
+        )
+        self.document_total = document_total
+        self.book_versions = dict(book_versions or {})
+        self.stale_documents = stale_documents
+        self._idf = None
+
+    def add_document(self, book_id, version, term_counts):
+        """
+        Count the terms of one book in the document frequencies.
+        """
+        new_terms = [term for term in term_counts if term not in self.vocabulary]
+        for term in new_terms:
+            self.vocabulary[term] = len(self.terms)
+            self.terms.append(term)
+        if new_terms:
+            self.document_frequencies = np.concatenate(
+                [self.document_frequencies, np.zeros(len(new_terms), dtype=np.int64)]
+            )
+
+        indices = [self.vocabulary[term] for term in term_counts]
+        self.document_frequencies[indices] += 1
+        self.document_total += 1
+        self.book_versions[book_id] = version
+        self._idf = None
+
+    @property
+    def idf(self):
+        if self._idf is None:
+            self._idf = np.log((1 + self.document_total) / (1 + self.document_frequencies)) + 1
+        return self._idf
+
+    @property
+    def stale_ratio(self):
+        return self.stale_documents / self.document_total if self.document_total else 0
+
+    def transform(self, term_counts_list):
+        """
+        Build the L2-normalised TF-IDF matrix (one row per Counter) and the
+        list of column terms. Terms outside the vocabulary get extra columns
+        with the highest IDF.
+        """
+        extra_terms = {}
+        indptr = [0]
+        indices = []
+        data = []
+        vocabulary_size = len(self.terms)
+        for term_counts in term_counts_list:
+            for term, count in term_counts.items():
+                index = self.vocabulary.get(term)
+                if index is None:
+                    index = extra_terms.setdefault(term, vocabulary_size + len(extra_terms))
+                indices.append(index)
+                data.append(count)
+            indptr.append(len(indices))
+
+        idf = np.concatenate([
+            self.idf,
+            np.full(len(extra_terms), np.log(1 + self.document_total) + 1),
+        ])
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), indptr),
+            shape=(len(term_counts_list), len(idf)),
+        )
+        matrix = matrix.multiply(idf).tocsr()
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        matrix = sparse.diags(1 / norms) @ matrix
+
+        return matrix.tocsr(), self.terms + list(extra_terms)
+
+    def score_many(self, term_counts_list, max_keywords=10):
+        """
+        Return the top keywords of every Counter in ``term_counts_list``.
+        """
+        matrix, column_terms = self.transform(term_counts_list)
+        results = []
+        for row in range(matrix.shape[0]):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            scores = matrix.data[start:end]
+            columns = matrix.indices[start:end]
+            if len(scores) > max_keywords:
+                top = np.argpartition(-scores, max_keywords)[:max_keywords]
+            else:
+                top = np.arange(len(scores))
+            # Ties are broken alphabetically so results are stable.
+            top = sorted(top, key=lambda i: (-scores[i], column_terms[columns[i]]))
+            results.append([column_terms[columns[i]] for i in top if scores[i] > MIN_SCORE])
+        return results
+
+    def score(self, term_counts, max_keywords=10):
+        return self.score_many([term_counts], max_keywords)[0]
+
+    def to_dict(self):
+        return {
+            'version': MODEL_VERSION,
+            'terms': self.terms,
+            'document_frequencies': self.document_frequencies,
+            'document_total': self.document_total,
+            'book_versions': self.book_versions,
+            'stale_documents': self.stale_documents,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError(f"Unsupported keyword model version: {data.get('version')}")
+        return cls(
+            terms=data['terms'],
+            document_frequencies=data['document_frequencies'],
+            document_total=data['document_total'],
+            book_versions=data['book_versions'],
+            stale_documents=data['stale_documents'],
+        )
+
+
+def get_model_path():
+    return str(getattr(settings, 'BOOK_KEYWORD_MODEL_PATH', settings.BASE_DIR / 'cache' / 'keyword_model.pickle'))
+
+
+def get_refit_ratio():
+    return getattr(settings, 'BOOK_KEYWORD_MODEL_REFIT_RATIO', 0.2)
+
+
+def save_keyword_model(model, path=None):
+    """
+    Write the model atomically so running workers never load a partial file.
+    """
+    path = path or get_model_path()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(model.to_dict(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+_loaded_model = None
+_loaded_mtime = None
+
+
+def get_keyword_model():
+    """
+    Return the stored model, or ``None`` when none has been built yet. The
+    model is loaded once per process and reloaded when the file changes.
+    """
+    global _loaded_model, _loaded_mtime
+    path = get_model_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        _loaded_model = _loaded_mtime = None
+        return None
+
+    if _loaded_model is None or mtime != _loaded_mtime:
+        with open(path, 'rb') as f:
+            _loaded_model = KeywordModel.from_dict(pickle.load(f))
+        _loaded_mtime = mtime
+    return _loaded_model
+
+
+def get_book_version(updated_at):
+    return updated_at.isoformat()
+
+
+def add_books(model, books, progress_callback=None):
+    """
+    Add the given books to the model. A book whose text cannot be read is
+    skipped and reported to ``progress_callback(book, error)``.
+    """
+    for book in books.only('id', 'title', 'pdf_file', 'updated_at').order_by('id').iterator():
+        try:
+            term_counts = count_book_terms(book)
+        except Exception as e:
+            if progress_callback:
+                progress_callback(book, e)
+            continue
+        model.add_document(book.id, get_book_version(book.updated_at), term_counts)
+        if progress_callback:
+            progress_callback(book, None)
+
+
+def fit_keyword_model(progress_callback=None):
+    """
+    Fit a new model over every book in the library.
+    """
+    model = KeywordModel()
+    add_books(model, Book.objects.all(), progress_callback)
+    return model
+
+
+def refresh_keyword_model(full=False, progress_callback=None):
+    """
+    Bring the stored model up to date and save it. Returns ``(model,
+    refitted)``; a full refit happens when requested, when no model exists
+    yet or when too much of it is stale.
+    """
+    model = None if full else get_keyword_model()
+
+    if model is not None:
+        current_versions = {
+            book_id: get_book_version(updated_at)
+            for book_id, updated_at in Book.objects.values_list('id', 'updated_at').iterator()
+        }
+        # Document frequencies only store counts, so the old terms of a
+        # changed or deleted book cannot be subtracted; they are tracked as
+        # stale until the next refit.
+        stale_ids = [
+            book_id for book_id, version in model.book_versions.items()
+            if current_versions.get(book_id) != version
+        ]
+        new_ids = [book_id for book_id in current_versions if book_id not in model.book_versions]
+        for book_id in stale_ids:
+            if book_id in current_versions:
+                model.book_versions[book_id] = current_versions[book_id]
+            else:
+                del model.book_versions[book_id]
+        model.stale_documents += len(stale_ids)
+
+        if model.stale_ratio <= get_refit_ratio():
+            add_books(model, Book.objects.filter(id__in=new_ids), progress_callback)
+            save_keyword_model(model)
+            return model, False
+
+    model = fit_keyword_model(progress_callback)
+    save_keyword_model(model)
+    return model, True
@@ -0,0 +1,158 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from books.catalog_cache import bump_catalog_version
+from books.keyword_model import get_keyword_model
+from books.models import Book
+from books.utils import extract_book_keywords
+
+
+def analyze_book(book_id, pdf_name, max_keywords):
+    """
+    Extract the keywords of one book in a pool process. Returns
+    ``(book_id, keywords, error)``.
+    """
+    book = Book(id=book_id, pdf_file=pdf_name)
+    try:
+        return book_id, ', '.join(extract_book_keywords(book, max_keywords)), None
+    except Exception as e:
+        return book_id, None, str(e)
+
+
+def parse_since(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(value)
+        parsed = datetime.combine(date, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Extract the keywords of many books at once with a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--genre', choices=[choice for choice, _label in Book.GENRE_CHOICES], help='Only analyze books of this genre')
+        parser.add_argument('--missing', action='store_true', help='Only analyze books without keywords')
+        parser.add_argument('--updated-since', help='Only analyze books updated since this date or datetime (YYYY-MM-DD[ HH:MM])')
+        parser.add_argument('--workers', type=int, default=None, help='Analysis processes (default: number of CPUs)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Books analyzed and saved per batch')
+        parser.add_argument('--max-keywords', type=int, default=10, help='Keywords stored per book')
+        parser.add_argument(
+            '--checkpoint',
+            default=str(settings.BASE_DIR / 'cache' / 'analyze_books.checkpoint.json'),
+            help='File recording the last saved batch so an interrupted run resumes there',
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first book')
+
+    def get_queryset(self, options):
+        books = Book.objects.all()
+        if options['genre']:
+            books = books.filter(genre=options['genre'])
+        if options['missing']:
+            books = books.filter(Q(keywords__isnull=True) | Q(keywords=''))
+        if options['updated_since']:
+            try:
+                books = books.filter(updated_at__gte=parse_since(options['updated_since']))
+            except ValueError:
+                raise CommandError(f"Invalid --updated-since value: {options['updated_since']}")
+        return books
+
+    def load_checkpoint(self, path, filters):
+        try:
+            with open(path) as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return 0
+        if checkpoint.get('filters') != filters:
+            self.stdout.write(self.style.WARNING('Ignoring checkpoint written with different filters'))
+            return 0
+        return checkpoint['last_id']
+
+    def save_checkpoint(self, path, filters, last_id):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'filters': filters, 'last_id': last_id}, f)
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        filters = {
+            'genre': options['genre'],
+            'missing': options['missing'],
+            'updated_since': options['updated_since'],
+            'max_keywords': options['max_keywords'],
+        }
+        checkpoint_path = options['checkpoint']
+        books = self.get_queryset(options)
+
+        last_id = 0 if options['restart'] else self.load_checkpoint(checkpoint_path, filters)
+        if last_id:
+            self.stdout.write(f'Resuming after book #{last_id}')
+
+        workers = max(1, options['workers'] or os.cpu_count() or 1)
+        batch_size = max(1, options['batch_size'])
+        total = books.filter(id__gt=last_id).count()
+        self.stdout.write(f'Analyzing {total} book(s) with {workers} process(es)...')
+
+        # Load the keyword model before forking so every process shares it.
+        get_keyword_model()
+
+        analyzed = failed = 0
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            while True:
+                # Keyset pagination on id, so books saved in earlier batches
+                # and books skipped by --missing never shift the next batch.
+                batch = list(
+                    books.filter(id__gt=last_id).order_by('id').values_list('id', 'pdf_file')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                book_ids, pdf_names = zip(*batch)
+                max_keywords = [options['max_keywords']] * len(batch)
+                if executor:
+                    # Pool processes may be forked during map(); they must not
+                    # inherit the parent's open database connection.
+                    connections.close_all()
+                    results = list(executor.map(analyze_book, book_ids, pdf_names, max_keywords))
+                else:
+                    results = list(map(analyze_book, book_ids, pdf_names, max_keywords))
+
+                updated = []
+                for book_id, keywords, error in results:
+                    if error is None:
+                        updated.append(Book(id=book_id, keywords=keywords))
+                    else:
+                        failed += 1
+                        self.stdout.write(self.style.WARNING(f'⚠ Failed to analyze book #{book_id}: {error}'))
+
+                # bulk_update leaves updated_at alone, so re-keywording does
+                # not mark the books as changed for the keyword model.
+                with transaction.atomic():
+                    Book.objects.bulk_update(updated, ['keywords'])
+                bump_catalog_version()
+                analyzed += len(updated)
+                last_id = book_ids[-1]
+                self.save_checkpoint(checkpoint_path, filters, last_id)
+                self.stdout.write(f'  {analyzed + failed}/{total} book(s) done')
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(f'Analyzed {analyzed} book(s), failed {failed}'))
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from books.models import Book, BookPage
+from books.processing import get_bulk_batch_size
+
+
+class Command(BaseCommand):
+    help = 'Compare BookPage insert throughput: one create() per page versus bulk_create() in one transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=500, help='Number of page rows to insert per run')
+        parser.add_argument('--batch-size', type=int, default=None, help='bulk_create batch size (default: BOOK_PAGE_BULK_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        page_total = options['pages']
+        batch_size = options['batch_size'] or get_bulk_batch_size()
+
+        # The benchmark runs against a temporary database with the same
+        # engine and schema, so nothing it writes reaches the site's data.
+        # The throwaway book is inserted with bulk_create, which sends no
+        # signals, and the cache (catalog version) is never touched.
+        old_name = connection.settings_dict['NAME']
+        old_test_settings = connection.settings_dict.get('TEST', {})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # A name of its own, so the test database of the test runner
+            # (possibly kept with --keepdb) is never touched. SQLite gets a
+            # fresh file on disk, as the site's database; the default test
+            # database would be in memory.
+            if connection.vendor == 'sqlite':
+                test_name = os.path.join(tmp_dir, 'benchmark.sqlite3')
+            else:
+                test_name = f'{old_name}_benchmark_page_ingest'
+            connection.settings_dict['TEST'] = {**old_test_settings, 'NAME': test_name}
+            self.stdout.write('Creating a temporary database...')
+            try:
+                # Without autoclobber an existing database of that name is
+                # only dropped after confirmation.
+                connection.creation.create_test_db(verbosity=0, autoclobber=False, serialize=False)
+                try:
+                    per_row_seconds, bulk_seconds = self.run_benchmark(page_total, batch_size)
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+            finally:
+                connection.settings_dict['TEST'] = old_test_settings
+
+        self.stdout.write(f'Inserted {page_total} BookPage rows per run')
+        self.stdout.write(f'  create() per page:        {per_row_seconds:8.3f}s  {page_total / per_row_seconds:10.0f} rows/s')
+        self.stdout.write(f'  bulk_create() in 1 txn:   {bulk_seconds:8.3f}s  {page_total / bulk_seconds:10.0f} rows/s')
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {per_row_seconds / bulk_seconds:.1f}x'))
+
+    def run_benchmark(self, page_total, batch_size):
+        book = Book.objects.bulk_create([Book(
+            title='[benchmark] page ingest',
+            description='Temporary book created by benchmark_page_ingest',
+            author='benchmark',
+            year=2000,
+            genre=Book.GENRE_CHOICES[0][0],
+            pdf_file='books/pdfs/benchmark.pdf',
+        )])[0]
+
+        start = time.perf_counter()
+        for page_number in range(1, page_total + 1):
+            BookPage.objects.create(
+                book=book,
+                page_number=page_number,
+                image=f'books/pages/book_{book.id}_page_{page_number}.png'
+            )
+        per_row_seconds = time.perf_counter() - start
+
+        BookPage.objects.filter(book=book).delete()
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            BookPage.objects.bulk_create(
+                [
+                    BookPage(
+                        book=book,
+                        page_number=page_number,
+                        image=f'books/pages/book_{book.id}_page_{page_number}.png'
+                    )
+                    for page_number in range(1, page_total + 1)
+                ],
+                batch_size=batch_size,
+            )
+        bulk_seconds = time.perf_counter() - start
+        return per_row_seconds, bulk_seconds
@@ -0,0 +1,66 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# The NLP stack should only be imported when text is actually analyzed.
+HEAVY_MODULES = ['nltk', 'sklearn', 'gensim', 'scipy', 'numpy']
+
+# Runs in a fresh interpreter: the work a gunicorn worker does before it can
+# serve its first request.
+WORKER_BOOT = """
+import json, sys, time
+start = time.perf_counter()
+from elibrary.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'modules': [m for m in %r if m in sys.modules]}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measure the time a web worker and a management command need to start'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters started per measurement')
+
+    def run_worker_boot(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'elibrary.settings'))
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER_BOOT % HEAVY_MODULES],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def run_command_boot(self):
+        # `manage.py check` sets up Django and imports every app's URLs and
+        # models, like any other command; this is its wall-clock time.
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, 'manage.py', 'check'],
+            cwd=settings.BASE_DIR, capture_output=True, check=True,
+        )
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        runs = max(1, options['runs'])
+
+        worker_results = [self.run_worker_boot() for _ in range(runs)]
+        worker_seconds = [result['seconds'] for result in worker_results]
+        command_seconds = [self.run_command_boot() for _ in range(runs)]
+
+        self.stdout.write(f'Startup time over {runs} fresh interpreter(s) (median / max):')
+        self.stdout.write(f'  web worker (wsgi + URLconf):  {statistics.median(worker_seconds):6.3f}s / {max(worker_seconds):6.3f}s')
+        self.stdout.write(f'  manage.py check:              {statistics.median(command_seconds):6.3f}s / {max(command_seconds):6.3f}s')
+
+        loaded = worker_results[0]['modules']
+        if loaded:
+            self.stdout.write(self.style.WARNING(f'Heavy modules imported at worker start: {", ".join(loaded)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No heavy modules imported at worker start'))
@@ -0,0 +1,91 @@
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.models import BookPageText
+from books.text import TextPipeline, get_text_pipeline
+
+SAMPLE_WORDS = (
+    'perpustakaan buku membaca cerita halaman penulis tokoh karakter dunia sejarah '
+    'library reading chapter story author character history science model pixel '
+    'yang dan di ke dari untuk dengan pada dalam adalah the and of to in is that '
+    '2024 v1.2 e-mail self-help, (catatan). "kutipan" 10% a_b'
+).split()
+
+
+def get_word_tokenizer():
+    """
+    NLTK's word_tokenize as used by the former keyword path, or str.split
+    when NLTK or its punkt data is not installed.
+    """
+    try:
+        from nltk.tokenize import word_tokenize
+        word_tokenize('a')
+        return word_tokenize, 'word_tokenize'
+    except (ImportError, LookupError):
+        return str.split, 'str.split'
+
+
+def tokenize_per_call(text, languages, word_tokenize):
+    """
+    The former keyword path: build the stopword set, strip punctuation with
+    a regular expression, tokenize and filter word by word on every call.
+    """
+    stop_words = TextPipeline(languages).stop_words | set()
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    words = word_tokenize(' '.join(text.split()))
+    return [
+        word for word in words
+        if word not in stop_words
+        and len(word) > 3
+        and not word.isdigit()
+        and word.isalpha()
+        and len(word) < 20
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Measure the throughput of the shared text pipeline against per-call tokenizing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book-id', type=int, help='Tokenize the indexed page texts of this book instead of generated text')
+        parser.add_argument('--pages', type=int, default=200, help='Generated pages when no book is given')
+        parser.add_argument('--words-per-page', type=int, default=400, help='Words per generated page')
+
+    def get_texts(self, options):
+        if options['book_id']:
+            return list(
+                BookPageText.objects.filter(book_id=options['book_id'], page_number__gt=0)
+                .order_by('page_number').values_list('text', flat=True)
+            )
+        rng = random.Random(0)
+        return [
+            ' '.join(rng.choice(SAMPLE_WORDS) for _ in range(options['words_per_page']))
+            for _ in range(options['pages'])
+        ]
+
+    def handle(self, *args, **options):
+        texts = self.get_texts(options)
+        if not texts:
+            self.stdout.write(self.style.WARNING('No text to tokenize'))
+            return
+        megabytes = sum(len(text.encode()) for text in texts) / (1024 * 1024)
+        pipeline = get_text_pipeline()
+        word_tokenize, tokenizer_name = get_word_tokenizer()
+
+        start = time.perf_counter()
+        old_terms = [tokenize_per_call(text, pipeline.languages, word_tokenize) for text in texts]
+        per_call_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_terms = [pipeline.terms(text) for text in texts]
+        pipeline_seconds = time.perf_counter() - start
+
+        self.stdout.write(f'Tokenized {len(texts)} page(s), {megabytes:.2f} MB')
+        self.stdout.write(f'  per-call {tokenizer_name:<20}{per_call_seconds:8.3f}s  {megabytes / per_call_seconds:8.2f} MB/s')
+        self.stdout.write(f'  TextPipeline.terms():        {pipeline_seconds:8.3f}s  {megabytes / pipeline_seconds:8.2f} MB/s')
+        if old_terms != new_terms:
+            self.stdout.write(self.style.WARNING('Note: the two tokenizers produced different terms for this text'))
+        self.stdout.write(self.style.SUCCESS(f'Speed-up: {per_call_seconds / pipeline_seconds:.1f}x'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from books.keyword_model import get_model_path, refresh_keyword_model
+
+
+class Command(BaseCommand):
+    help = 'Build or incrementally refresh the library-wide TF-IDF keyword model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Refit the model over every book instead of only adding new ones')
+
+    def handle(self, *args, **options):
+        added = failed = 0
+
+        def report(book, error):
+            nonlocal added, failed
+            if error is None:
+                added += 1
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠ Failed to read "{book.title}": {error}'))
+
+        model, refitted = refresh_keyword_model(full=options['full'], progress_callback=report)
+
+        action = 'Fitted' if refitted else 'Refreshed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} keyword model at {get_model_path()}: {model.document_total} book(s), '
+            f'{len(model.terms)} term(s); added {added}, failed {failed}'
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "readers who liked this also liked" table from favorite co-occurrence'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        books = build_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored recommendations for {books} book(s) in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from books.similarity import update_similar_books
+
+
+class Command(BaseCommand):
+    help = 'Update the precomputed "similar books" index from the stored topic vectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute the neighbours of every book')
+
+    def handle(self, *args, **options):
+        updated = update_similar_books(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed similar books for {updated} book(s)'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.processing import rebuild_sprite_sheets
+
+
+class Command(BaseCommand):
+    help = 'Build the thumbnail sprite sheets used by the page grid'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book-id', type=int, action='append', dest='book_ids', help='Only build sheets for this book (repeatable)')
+        parser.add_argument('--missing', action='store_true', help='Only build sheets for books that have none yet')
+
+    def handle(self, *args, **options):
+        books = Book.objects.filter(page_count__gt=0).order_by('id')
+        if options['book_ids']:
+            books = books.filter(id__in=options['book_ids'])
+        if options['missing']:
+            books = books.filter(sprite_sheets__isnull=True)
+
+        built = failed = 0
+        for book in books.iterator():
+            try:
+                sheets = rebuild_sprite_sheets(book)
+                built += 1
+                self.stdout.write(f'✓ "{book.title}": {sheets} sheet(s)')
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠ Failed to build sprite sheets for "{book.title}": {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Built sprite sheets for {built} book(s), failed {failed}'))
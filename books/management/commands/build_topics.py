@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.similarity import update_similar_books
+from books.topics import fit_topic_model, infer_new_topics
+
+
+class Command(BaseCommand):
+    help = 'Fit the LDA topic model over the catalog and store every book\'s topic vector'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--new-only', action='store_true', help='Only give books without a topic vector one from the stored model')
+
+    def handle(self, *args, **options):
+        failed = 0
+
+        def report(book, error):
+            nonlocal failed
+            if error is not None:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠ Failed to read "{book.title}": {error}'))
+
+        if options['new_only']:
+            added = infer_new_topics(report)
+            if added is None:
+                raise CommandError('No topic model has been fitted yet; run build_topics without --new-only first')
+            self.stdout.write(self.style.SUCCESS(f'Added topic vectors for {added} book(s), failed {failed}'))
+        else:
+            try:
+                fitted = fit_topic_model(report)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'Fitted topics over {fitted} book(s), failed {failed}'))
+
+        # Similar books are computed from the topic vectors.
+        updated = update_similar_books()
+        self.stdout.write(self.style.SUCCESS(f'Recomputed similar books for {updated} book(s)'))
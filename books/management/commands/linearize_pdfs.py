@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.processing import linearize_pdf
+
+
+class Command(BaseCommand):
+    help = 'Linearize the PDFs of existing books for fast first-page display in the PDF reader'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book-id', type=int, action='append', dest='book_ids', help='Only linearize the PDF of this book (repeatable)')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(pdf_file='').order_by('id')
+        if options['book_ids']:
+            books = books.filter(id__in=options['book_ids'])
+
+        linearized = skipped = failed = 0
+        for book in books.iterator():
+            try:
+                if linearize_pdf(book.pdf_file.path):
+                    linearized += 1
+                    self.stdout.write(f'✓ "{book.title}"')
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠ Failed to linearize "{book.title}": {e}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Linearized {linearized} PDF(s), {skipped} skipped (already linearized or signed), failed {failed}'
+        ))
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from books.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run the background worker that renders uploaded PDFs into page images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs currently in the queue and exit',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'BOOK_PROCESSING_POLL_INTERVAL', 2),
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--render-workers',
+            type=int,
+            default=None,
+            help='Processes used to render the pages of one book (default: BOOK_RENDER_WORKERS)',
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s)'))
+
+        self.stdout.write('Waiting for processing jobs...')
+
+        try:
+            while True:
+                job = claim_next_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f'Processing "{job.book.title}" (job {job.pk}, attempt {job.attempts})...')
+                if run_job(job, render_workers=options['render_workers']):
+                    self.stdout.write(self.style.SUCCESS(f'✓ Job {job.pk} finished'))
+                else:
+                    self.stdout.write(self.style.WARNING(f'⚠ Job {job.pk} failed: {job.error}'))
+        except KeyboardInterrupt:
+            self.stdout.write('Worker stopped.')
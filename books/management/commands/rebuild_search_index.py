@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.search import index_book
+
+
+class Command(BaseCommand):
+    help = 'Extract the text of every book and rebuild the full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book-id', type=int, action='append', dest='book_ids', help='Only index this book (repeatable)')
+
+    def handle(self, *args, **options):
+        books = Book.objects.all().order_by('id')
+        if options['book_ids']:
+            books = books.filter(id__in=options['book_ids'])
+
+        indexed = failed = 0
+        for book in books.iterator():
+            try:
+                pages = index_book(book)
+                indexed += 1
+                self.stdout.write(f'✓ "{book.title}": {pages} page(s) with text')
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠ Failed to index "{book.title}": {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} book(s), failed {failed}'))
@@ -0,0 +1,62 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from books.image_profiles import get_extension, get_image_profile
+from books.models import Book
+from books.page_cache import purge_book
+from books.processing import process_pdf_to_images, transcode_page_images
+
+
+class Command(BaseCommand):
+    help = 'Re-encode existing page images with the profiles in BOOK_PAGE_IMAGE_PROFILES'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book-id', type=int, action='append', dest='book_ids', help='Only re-encode this book (repeatable)')
+        parser.add_argument('--genre', choices=[choice for choice, _label in Book.GENRE_CHOICES], help='Only re-encode books of this genre')
+        parser.add_argument('--force', action='store_true', help='Also re-encode books already stored in the target format')
+        parser.add_argument('--from-images', action='store_true', help='Transcode the existing images instead of re-rendering the PDF (keeps the current resolution)')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes per book (default: BOOK_RENDER_WORKERS)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the books that would be re-encoded')
+
+    def handle(self, *args, **options):
+        books = Book.objects.all().order_by('id')
+        if options['book_ids']:
+            books = books.filter(id__in=options['book_ids'])
+        if options['genre']:
+            books = books.filter(genre=options['genre'])
+
+        done = skipped = failed = 0
+        for book in books.iterator():
+            profile = get_image_profile(book.genre)
+            extension = get_extension(profile)
+            first_page = book.pages.exclude(image='').first()
+
+            if first_page is None:
+                # Lazily rendered book: dropping the cache is enough for the
+                # new profile to apply.
+                if not options['dry_run']:
+                    purge_book(book.id)
+                skipped += 1
+                continue
+
+            if first_page.image.name.endswith(f'.{extension}') and not options['force']:
+                skipped += 1
+                continue
+
+            self.stdout.write(f'Re-encoding "{book.title}" as {profile["format"]} ({profile["dpi"]} DPI, quality {profile["quality"]})...')
+            if options['dry_run']:
+                done += 1
+                continue
+
+            try:
+                if options['from_images'] or not os.path.exists(book.pdf_file.path):
+                    transcode_page_images(book, profile)
+                else:
+                    process_pdf_to_images(book, workers=options['workers'], render_mode='eager', profile=profile)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠ Failed to re-encode "{book.title}": {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Re-encoded {done} book(s), skipped {skipped}, failed {failed}'))
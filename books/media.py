@@ -0,0 +1,225 @@
+"""
+Serving files with HTTP validators.
+
+Rendered page images, their variants, sprite sheets and covers are stored
+under content-hashed names (see ``books.rendering.hashed_filename``): the
+bytes behind such a URL never change, so responses are marked ``immutable``
+and browsers keep them without asking again. Every other file is sent with
+an ETag and Last-Modified and revalidated on each use, which a repeat reader
+pays for with an empty 304 response.
+
+Django only authorizes the request. With BOOK_MEDIA_SENDFILE set, the bytes
+are sent by the front web server (nginx ``X-Accel-Redirect`` or Apache /
+lighttpd ``X-Sendfile``), which also answers range requests. Otherwise they
+are streamed from Django, which supports ``Range`` itself (single and
+multipart byte ranges, ``If-Range``), so a PDF viewer can fetch only the
+pages it shows.
+"""
+import mimetypes
+import os
+import secrets
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .rendering import split_hashed_filename
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Requests with more ranges than this get the whole file.
+MAX_RANGES = 32
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_file_validators(path, stat):
+    """
+    Return ``(etag, last_modified, immutable)`` for a file. The ETag of a
+    content-hashed file is its hash.
+    """
+    digest = split_hashed_filename(os.path.basename(path))[1]
+    etag = digest or f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    return f'"{etag}"', int(stat.st_mtime), digest is not None
+
+
+def get_sendfile_settings():
+    return (
+        getattr(settings, 'BOOK_MEDIA_SENDFILE', None),
+        getattr(settings, 'BOOK_MEDIA_ACCEL_PREFIX', '/protected-media/'),
+    )
+
+
+def get_content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def sendfile_response(path):
+    """
+    An empty response telling the front web server to send the file at
+    ``path``, or ``None`` when Django has to send it.
+    """
+    mode, accel_prefix = get_sendfile_settings()
+    if mode is None:
+        return None
+
+    content_type = get_content_type(path)
+    if mode == 'x-accel-redirect':
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT)
+        if relative_path.startswith(os.pardir):
+            # Only MEDIA_ROOT is mapped to the internal location.
+            return None
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(accel_prefix + relative_path.replace(os.sep, '/'))
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = os.path.abspath(path)
+    else:
+        raise ImproperlyConfigured(f"Unknown BOOK_MEDIA_SENDFILE: {mode}")
+    return response
+
+
+def parse_range_header(header, size):
+    """
+    Byte ranges of a ``Range`` header for a file of ``size`` bytes, as sorted
+    and merged ``(start, stop)`` pairs with ``stop`` exclusive. Returns
+    ``None`` when the header is malformed or asks for too many ranges, and an
+    empty list when no range is satisfiable.
+    """
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+
+    ranges = []
+    for spec in specs.split(','):
+        first, dash, last = spec.strip().partition('-')
+        if not dash or not (first or last) or not all(value.isdigit() for value in (first, last) if value):
+            return None
+        if not first:
+            # A suffix range: the last ``last`` bytes.
+            start, stop = max(0, size - int(last)), size
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            stop = min(int(last) + 1, size) if last else size
+        if start < stop:
+            ranges.append((start, stop))
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def if_range_passes(request, etag, last_modified):
+    """
+    Whether a range request may be answered with a part of the current file:
+    ``If-Range`` is absent or still matches it.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    if if_range.startswith('W/'):
+        # Weak validators never allow a partial response.
+        return False
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def iter_file_range(path, start, stop):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def partial_response(path, ranges, size):
+    """
+    A 206 response with the ``ranges`` of the file, as a multipart body when
+    there is more than one.
+    """
+    content_type = get_content_type(path)
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        response = StreamingHttpResponse(iter_file_range(path, start, stop), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        response['Content-Length'] = stop - start
+        return response
+
+    boundary = secrets.token_hex(16)
+    parts = [
+        (f'--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n'.encode(), start, stop)
+        for start, stop in ranges
+    ]
+    closing = f'--{boundary}--\r\n'.encode()
+
+    def stream():
+        for header, start, stop in parts:
+            yield header
+            yield from iter_file_range(path, start, stop)
+            yield b'\r\n'
+        yield closing
+
+    response = StreamingHttpResponse(stream(), status=206, content_type=f'multipart/byteranges; boundary={boundary}')
+    response['Content-Length'] = sum(len(header) + stop - start + 2 for header, start, stop in parts) + len(closing)
+    return response
+
+
+def django_file_response(request, path, size, etag, last_modified):
+    """
+    Send the whole file or, for a ``Range`` request, the asked parts of it.
+    """
+    ranges = None
+    if request.method == 'GET' and 'HTTP_RANGE' in request.META and if_range_passes(request, etag, last_modified):
+        ranges = parse_range_header(request.META['HTTP_RANGE'], size)
+
+    if ranges is None:
+        response = FileResponse(open(path, 'rb'))
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    else:
+        response = partial_response(path, ranges, size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_response(request, path, private=False):
+    """
+    Send the file at ``path``, or a 304 response when the client's copy is
+    current. ``private`` keeps shared caches from storing it.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('File tidak ditemukan.')
+    etag, last_modified, immutable = get_file_validators(path, stat)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = sendfile_response(path)
+    if response is None:
+        response = django_file_response(request, path, stat.st_size, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    audience = {'private': True} if private else {'public': True}
+    if immutable:
+        patch_cache_control(response, max_age=IMMUTABLE_MAX_AGE, immutable=True, **audience)
+    else:
+        patch_cache_control(response, no_cache=True, **audience)
+    return response
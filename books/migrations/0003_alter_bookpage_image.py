@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_processingjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookpage',
+            name='image',
+            field=models.ImageField(blank=True, upload_to='books/pages/'),
+        ),
+    ]
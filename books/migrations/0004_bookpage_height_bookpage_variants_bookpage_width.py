@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_alter_bookpage_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookpage',
+            name='height',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookpage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='bookpage',
+            name='width',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_bookpage_height_bookpage_variants_bookpage_width'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageSpriteSheet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_page', models.IntegerField()),
+                ('last_page', models.IntegerField()),
+                ('image', models.ImageField(upload_to='books/sprites/')),
+                ('columns', models.IntegerField()),
+                ('tile_width', models.IntegerField()),
+                ('tile_height', models.IntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sprite_sheets', to='books.book')),
+            ],
+            options={
+                'ordering': ['first_page'],
+                'unique_together': {('book', 'first_page')},
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = "books_bookpagetext_fts"
+
+CREATE_FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        text,
+        content='books_bookpagetext',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER books_bookpagetext_ai AFTER INSERT ON books_bookpagetext BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER books_bookpagetext_ad AFTER DELETE ON books_bookpagetext BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER books_bookpagetext_au AFTER UPDATE ON books_bookpagetext BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS books_bookpagetext_ai",
+    "DROP TRIGGER IF EXISTS books_bookpagetext_ad",
+    "DROP TRIGGER IF EXISTS books_bookpagetext_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def create_fts_index(apps, schema_editor):
+    # The FTS5 index only exists on SQLite; other databases fall back to
+    # books.search.DatabaseSearchBackend.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in CREATE_FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in DROP_FTS_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0005_pagespritesheet"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookPageText",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("page_number", models.IntegerField()),
+                ("text", models.TextField()),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="page_texts",
+                        to="books.book",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["page_number"],
+                "unique_together": {("book", "page_number")},
+            },
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
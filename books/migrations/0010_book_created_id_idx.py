@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0009_bookrecommendation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="book_created_id_idx"
+            ),
+        ),
+    ]
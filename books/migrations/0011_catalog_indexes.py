@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0010_book_created_id_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["genre", "-created_at", "-id"], name="book_genre_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="favorite",
+            index=models.Index(
+                fields=["user", "-created_at"], name="favorite_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processingjob",
+            index=models.Index(
+                fields=["status", "created_at", "id"], name="job_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processingjob",
+            index=models.Index(
+                fields=["book", "-created_at", "-id"], name="job_book_created_idx"
+            ),
+        ),
+    ]
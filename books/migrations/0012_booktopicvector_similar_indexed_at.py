@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0011_catalog_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="booktopicvector",
+            name="similar_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="booktopicvector",
+            name="similar_indexed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
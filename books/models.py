@@ -1,5 +1,9 @@
+from array import array
+
+from django.core.files.storage import default_storage
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 import os
 
 User = get_user_model()
@@ -23,6 +27,14 @@ class Book(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Catalog order and keyset pagination (see books.pagination).
+            models.Index(fields=['-created_at', '-id'], name='book_created_id_idx'),
+            # The same order within one genre.
+            models.Index(fields=['genre', '-created_at', '-id'], name='book_genre_created_idx'),
+        ]
+    
     def __str__(self):
         return self.title
     
@@ -30,11 +42,18 @@ class Book(models.Model):
         if self.cover_image:
             return self.cover_image.url
         return None
+    
+    def latest_processing_job(self):
+        return self.processing_jobs.order_by('-created_at', '-id').first()
 
 class BookPage(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='pages')
     page_number = models.IntegerField()
-    image = models.ImageField(upload_to='books/pages/')
+    image = models.ImageField(upload_to='books/pages/', blank=True)
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+    # Smaller renditions of the page: {name: {'image': ..., 'width': ..., 'height': ...}}
+    variants = models.JSONField(default=dict, blank=True)
     
     class Meta:
         ordering = ['page_number']
@@ -42,6 +61,84 @@ class BookPage(models.Model):
     
     def __str__(self):
         return f"{self.book.title} - Page {self.page_number}"
+    
+    def get_image_url(self):
+        if self.image:
+            return self.image.url
+        return reverse('books:page_image', args=[self.book_id, self.page_number])
+    
+    def get_variant_url(self, name):
+        variant = self.variants.get(name)
+        if variant:
+            return default_storage.url(variant['image'])
+        return self.get_image_url()
+    
+    def get_srcset(self):
+        """
+        ``srcset`` value listing the variants and the full image by width.
+        """
+        if not self.width:
+            return ''
+        candidates = [
+            (variant['width'], default_storage.url(variant['image']))
+            for variant in self.variants.values()
+        ]
+        candidates.append((self.width, self.get_image_url()))
+        candidates.sort()
+        return ', '.join(f"{url} {width}w" for width, url in candidates)
+    
+    def get_image_names(self):
+        """
+        Storage names of the page image and all of its variants.
+        """
+        names = [variant['image'] for variant in self.variants.values()]
+        if self.image:
+            names.append(self.image.name)
+        return names
+
+class BookPageText(models.Model):
+    """
+    Text of one PDF page, indexed for full-text search (see ``books.search``).
+    Page number 0 holds the book's metadata (title, author, year, description).
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='page_texts')
+    page_number = models.IntegerField()
+    text = models.TextField()
+    
+    class Meta:
+        ordering = ['page_number']
+        unique_together = ['book', 'page_number']
+    
+    def __str__(self):
+        return f"{self.book.title} - Text {self.page_number}"
+
+class PageSpriteSheet(models.Model):
+    """
+    One image holding the thumbnails of pages ``first_page`` to ``last_page``,
+    laid out row by row in ``columns`` cells of ``tile_width`` x ``tile_height``.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='sprite_sheets')
+    first_page = models.IntegerField()
+    last_page = models.IntegerField()
+    image = models.ImageField(upload_to='books/sprites/')
+    columns = models.IntegerField()
+    tile_width = models.IntegerField()
+    tile_height = models.IntegerField()
+    
+    class Meta:
+        ordering = ['first_page']
+        unique_together = ['book', 'first_page']
+    
+    def __str__(self):
+        return f"{self.book.title} - Pages {self.first_page}-{self.last_page}"
+    
+    def get_tiles(self):
+        """
+        Yield ``(page_number, x, y)`` with the pixel offset of every page's
+        thumbnail inside the sheet.
+        """
+        for index, page_number in enumerate(range(self.first_page, self.last_page + 1)):
+            yield page_number, (index % self.columns) * self.tile_width, (index // self.columns) * self.tile_height
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -50,6 +147,146 @@ class Favorite(models.Model):
     
     class Meta:
         unique_together = ['user', 'book']
+        indexes = [
+            # A user's favorites, newest first.
+            models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.book.title}"
+
+class ProcessingJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Menunggu'),
+        (STATUS_RUNNING, 'Diproses'),
+        (STATUS_DONE, 'Selesai'),
+        (STATUS_FAILED, 'Gagal'),
+    ]
+    
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='processing_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    processed_pages = models.IntegerField(default=0)
+    total_pages = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # The worker queue (``claim_next_job``) and a book's latest job.
+            models.Index(fields=['status', 'created_at', 'id'], name='job_status_created_idx'),
+            models.Index(fields=['book', '-created_at', '-id'], name='job_book_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.book.title} - {self.get_status_display()}"
+    
+    @property
+    def is_active(self):
+        return self.status in (self.STATUS_PENDING, self.STATUS_RUNNING)
+    
+    @property
+    def progress_percent(self):
+        if not self.total_pages:
+            return 0
+        return int(self.processed_pages * 100 / self.total_pages)
+
+class Topic(models.Model):
+    """
+    One topic of the LDA model fitted over the catalog (see ``books.topics``).
+    """
+    number = models.IntegerField(unique=True)
+    # Most probable terms of the topic, best first.
+    terms = models.JSONField(default=list)
+    # Share of the topic's weight that falls on each genre: {genre: share}
+    genre_weights = models.JSONField(default=dict)
+    book_count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['number']
+    
+    def __str__(self):
+        return f"Topik {self.number}: {', '.join(self.terms[:5])}"
+    
+    @property
+    def label(self):
+        return ', '.join(self.terms[:3])
+
+class BookTopicVector(models.Model):
+    """
+    Topic distribution of a book, stored as packed float32 values in topic
+    number order.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='topic_vector')
+    vector = models.BinaryField()
+    dominant_topic = models.IntegerField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # When the book's SimilarBook rows were last computed and how many there
+    # were (see books.similarity).
+    similar_indexed_at = models.DateTimeField(null=True, blank=True)
+    similar_count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.book.title} - Topik {self.dominant_topic}"
+    
+    def get_vector(self):
+        return array('f', bytes(self.vector)).tolist()
+    
+    def suggest_genre(self, topics):
+        """
+        Genre whose books share the most topic weight with this book, given
+        all topics in number order, or ``None`` when there are no topics.
+        """
+        scores = {}
+        for weight, topic in zip(self.get_vector(), topics):
+            for genre, share in topic.genre_weights.items():
+                scores[genre] = scores.get(genre, 0) + weight * share
+        if not scores:
+            return None
+        return max(scores, key=scores.get)
+
+class SimilarBook(models.Model):
+    """
+    Precomputed nearest neighbour of a book, ``rank`` 1 being the most
+    similar (see ``books.similarity``).
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_entries')
+    similar_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.IntegerField()
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['book', 'rank']
+        unique_together = ['book', 'rank']
+    
+    def __str__(self):
+        return f"{self.book.title} ~ {self.similar_book.title} ({self.score:.2f})"
+
+class BookRecommendation(models.Model):
+    """
+    "Readers who liked this also liked": a book often favorited by the same
+    users as ``book``, ``rank`` 1 being the strongest (see
+    ``books.recommendations``).
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations')
+    recommended_book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.IntegerField()
+    score = models.FloatField()
+    # Number of users who favorited both books.
+    co_favorites = models.IntegerField()
+    
+    class Meta:
+        ordering = ['book', 'rank']
+        unique_together = ['book', 'rank']
+    
+    def __str__(self):
+        return f"{self.book.title} -> {self.recommended_book.title} ({self.score:.2f})"
@@ -0,0 +1,119 @@
+"""
+On-demand page rendering with a size-bounded LRU disk cache.
+
+In the ``lazy`` render mode page images are not written at upload time.
+They are rendered from the stored PDF on first request and kept under
+``MEDIA_ROOT/BOOK_PAGE_CACHE_DIR``. A cache hit refreshes the file's access
+time, and once the cache grows beyond BOOK_PAGE_CACHE_MAX_BYTES the least
+recently used files are evicted. The modification time is left alone: the
+ETag and Last-Modified of a cached page are derived from it.
+"""
+import glob
+import os
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from .image_profiles import get_extension, get_image_profile
+from .rendering import render_page_image
+
+
+def get_cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, getattr(settings, 'BOOK_PAGE_CACHE_DIR', 'cache/pages'))
+
+
+def get_cache_path(book_id, page_number, extension):
+    return os.path.join(get_cache_dir(), f"book_{book_id}_page_{page_number}.{extension}")
+
+
+def get_cached_page(book, page_number):
+    """
+    Return the path of the rendered page image, rendering it into the cache
+    first when it is missing. Pages are rendered with the image profile of
+    the book's genre.
+    """
+    profile = get_image_profile(book.genre)
+    path = get_cache_path(book.id, page_number, get_extension(profile))
+    if os.path.exists(path):
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+            return path
+        except FileNotFoundError:
+            # Evicted by another process between the check and the touch.
+            pass
+
+    cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    doc = fitz.open(book.pdf_file.path)
+    try:
+        img_data = render_page_image(doc, page_number - 1, profile)
+    finally:
+        doc.close()
+
+    # Write to a temporary file first so concurrent readers never see a
+    # partially written image.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(img_data)
+    os.replace(tmp_path, path)
+
+    evict(keep=path)
+    return path
+
+
+def evict(max_bytes=None, keep=None):
+    """
+    Delete the least recently used cache files until the cache fits in
+    ``max_bytes`` (default BOOK_PAGE_CACHE_MAX_BYTES). Returns the number of
+    deleted files.
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'BOOK_PAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+
+    entries = []
+    total_size = 0
+    try:
+        with os.scandir(get_cache_dir()) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+                total_size += stat.st_size
+    except FileNotFoundError:
+        return 0
+
+    if total_size <= max_bytes:
+        return 0
+
+    deleted = 0
+    entries.sort()
+    for _atime, size, path in entries:
+        if total_size <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+        deleted += 1
+    return deleted
+
+
+def purge_book(book_id):
+    """
+    Remove every cached page of a book, e.g. after its PDF was replaced.
+    """
+    for path in glob.glob(os.path.join(get_cache_dir(), f"book_{book_id}_page_*.*")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,139 @@
+"""
+Keyset (cursor) pagination for the catalog.
+
+Books are listed newest first, ordered by ``(created_at, id)`` so the order is
+total. Instead of an OFFSET, a page is fetched with a condition on the last
+(or first) row of the neighbouring page, encoded in an opaque cursor, so page
+500 costs the same index range scan as page 1. Totals for the "Page x of y"
+label come from ``get_cached_count``, cached per catalog version.
+"""
+import base64
+import math
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .catalog_cache import get_cache_timeout, make_key
+
+ORDERING = ('-created_at', '-id')
+
+
+def encode_cursor(book):
+    """
+    Cursor of a book, given as a model instance or a ``.values()`` row.
+    """
+    if isinstance(book, dict):
+        created_at, book_id = book['created_at'], book['id']
+    else:
+        created_at, book_id = book.created_at, book.id
+    value = f"{created_at.isoformat()}|{book_id}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Return ``(created_at, id)`` from a cursor, or ``None`` when it is invalid.
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, book_id = value.split('|')
+        return datetime.fromisoformat(created_at), int(book_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def get_cached_count(queryset, key_parts, timeout=None):
+    """
+    Count ``queryset`` once per catalog version for the same filters.
+    ``key_parts`` must identify the filters.
+    """
+    if timeout is None:
+        timeout = get_cache_timeout()
+    key = get_count_key(key_parts)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def forget_cached_count(key_parts):
+    cache.delete(get_count_key(key_parts))
+
+
+def get_count_key(key_parts):
+    return make_key('count', *key_parts)
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset, with the cursors of its
+    neighbours. ``number`` and ``num_pages`` are only for display.
+    """
+
+    def __init__(self, object_list, number, count, per_page, has_next, has_previous):
+        self.object_list = object_list
+        self.number = number
+        self.count = count
+        self.num_pages = max(1, math.ceil(count / per_page))
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self.has_previous else None
+
+
+def paginate_keyset(queryset, per_page, count, after=None, before=None, last=False, number=1):
+    """
+    Fetch one page of ``queryset`` newest first: the page following the
+    ``after`` cursor, the page preceding the ``before`` cursor, the last page
+    when ``last`` is set, or the first page.
+    """
+    if last:
+        number = max(1, math.ceil(count / per_page))
+        # Only the remainder, so paging back from here meets the same page
+        # boundaries as paging forward from the first page.
+        rows = list(queryset.order_by('created_at', 'id')[:count % per_page or per_page])
+        rows.reverse()
+        return KeysetPage(rows, number, count, per_page, has_next=False, has_previous=count > len(rows))
+
+    position = decode_cursor(before or after or '')
+    if position is None:
+        rows = list(queryset.order_by(*ORDERING)[:per_page + 1])
+        return KeysetPage(rows[:per_page], 1, count, per_page, has_next=len(rows) > per_page, has_previous=False)
+
+    created_at, book_id = position
+    # The range condition on created_at alone lets the database seek into
+    # the (created_at, id) index; the OR only breaks ties within it.
+    if before:
+        rows = list(
+            queryset.filter(created_at__gte=created_at)
+            .filter(Q(created_at__gt=created_at) | Q(id__gt=book_id))
+            .order_by('created_at', 'id')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        return KeysetPage(rows, max(1, number), count, per_page, has_next=True, has_previous=has_previous)
+
+    rows = list(
+        queryset.filter(created_at__lte=created_at)
+        .filter(Q(created_at__lt=created_at) | Q(id__lt=book_id))
+        .order_by(*ORDERING)[:per_page + 1]
+    )
+    return KeysetPage(rows[:per_page], max(1, number), count, per_page, has_next=len(rows) > per_page, has_previous=True)
@@ -0,0 +1,356 @@
+import glob
+import logging
+import os
+import posixpath
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+from .image_profiles import get_extension, get_image_profile, get_variant_widths
+from .models import BookPage, PageSpriteSheet
+from .page_cache import purge_book
+from .rendering import (
+    encode_image, hashed_filename, render_page_image, render_pages, render_sprite_sheet, split_hashed_filename,
+    write_file,
+)
+from .search import build_page_texts, replace_page_texts
+
+logger = logging.getLogger(__name__)
+
+
+def get_render_workers():
+    """
+    Number of processes used to render pages, from BOOK_RENDER_WORKERS.
+    Defaults to one process per CPU core.
+    """
+    workers = getattr(settings, 'BOOK_RENDER_WORKERS', None)
+    return workers or os.cpu_count() or 1
+
+
+def get_render_mode():
+    """
+    Page render mode from BOOK_PAGE_RENDER_MODE: ``eager`` renders every page
+    at upload, ``lazy`` renders pages on first read (see ``books.page_cache``).
+    """
+    return getattr(settings, 'BOOK_PAGE_RENDER_MODE', 'eager')
+
+
+def get_linearize_setting():
+    return getattr(settings, 'BOOK_PDF_LINEARIZE', True)
+
+
+def linearize_pdf(path):
+    """
+    Rewrite the PDF at ``path`` linearized ("fast web view"), so a viewer
+    fetching it with range requests can show the first page before the rest
+    of the file has arrived. Returns ``False`` when it already was or is
+    digitally signed.
+
+    The upload is replaced rather than copied: linearizing only reorders the
+    file's objects and drops unused ones, so the pages are unchanged, and the
+    reader, downloads and later reprocessing all keep using one file. Once
+    linearized a file is left alone on the next run. A rewrite would break a
+    digital signature, so signed PDFs stay as uploaded.
+    """
+    doc = fitz.open(path)
+    try:
+        if doc.is_fast_webaccess or doc.get_sigflags() > 0:
+            return False
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            doc.save(tmp_path, garbage=3, linear=True)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    finally:
+        doc.close()
+    os.replace(tmp_path, path)
+    return True
+
+
+def get_bulk_batch_size():
+    return getattr(settings, 'BOOK_PAGE_BULK_BATCH_SIZE', 500)
+
+
+def get_sprite_settings():
+    """
+    Return ``(pages_per_sheet, columns, tile_width)`` for page sprite sheets.
+    """
+    return (
+        getattr(settings, 'BOOK_SPRITE_PAGES_PER_SHEET', 60),
+        getattr(settings, 'BOOK_SPRITE_COLUMNS', 10),
+        getattr(settings, 'BOOK_SPRITE_TILE_WIDTH', 120),
+    )
+
+
+def render_sprite_sheets(book, pdf_path, total_pages, profile):
+    """
+    Render the thumbnail sprite sheets of a book. Returns the unsaved
+    PageSpriteSheet objects and the paths of the written files.
+    """
+    pages_per_sheet, columns, tile_width = get_sprite_settings()
+    extension = get_extension(profile)
+    sprites_dir = os.path.join(settings.MEDIA_ROOT, 'books', 'sprites')
+    os.makedirs(sprites_dir, exist_ok=True)
+    
+    sheets = []
+    paths = []
+    for start in range(0, total_pages, pages_per_sheet):
+        stop = min(start + pages_per_sheet, total_pages)
+        img_data, tile_height = render_sprite_sheet(pdf_path, start, stop, tile_width, columns, profile)
+        sheet_filename = hashed_filename(f"book_{book.id}_sprite_{start + 1}.{extension}", img_data)
+        sheet_path = os.path.join(sprites_dir, sheet_filename)
+        
+        paths.append(sheet_path)
+        write_file(sheet_path, img_data)
+        
+        sheets.append(PageSpriteSheet(
+            book=book,
+            first_page=start + 1,
+            last_page=stop,
+            image=f'books/sprites/{sheet_filename}',
+            columns=columns,
+            tile_width=tile_width,
+            tile_height=tile_height,
+        ))
+    return sheets, paths
+
+
+def _remove_files_written_since(paths, started_at):
+    """
+    Delete the files in ``paths`` that were (re)written at or after
+    ``started_at``, leaving older files untouched.
+    """
+    for path in paths:
+        try:
+            if os.stat(path).st_mtime >= started_at:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _delete_media_files(names, keep=()):
+    """
+    Delete media files by their storage name, skipping the names in ``keep``.
+    """
+    for name in set(names) - set(keep):
+        if not name:
+            continue
+        try:
+            os.remove(os.path.join(settings.MEDIA_ROOT, name))
+        except FileNotFoundError:
+            pass
+
+
+def process_pdf_to_images(book, progress_callback=None, workers=None, render_mode=None, profile=None):
+    """
+    Render the book's PDF into a cover image, one image per page and the
+    thumbnail sprite sheets used by the page grid, and index the text of
+    every page for full-text search.
+
+    All images are rendered first; the BookPage rows are then replaced with
+    ``bulk_create`` in a single transaction together with the book's cover
+    and page count. Image names carry a hash of their content (see
+    ``books.rendering.hashed_filename``), so a replaced PDF never reuses the
+    URL of an old image. If anything fails, the files written by this run are
+    removed and the database is left untouched, so the function can simply
+    be re-run. ``progress_callback`` is called as
+    ``progress_callback(processed_pages, total_pages)``. Pages are rendered by
+    ``workers`` processes (see ``get_render_workers``) with the image profile
+    of the book's genre unless ``profile`` is given. The PDF itself is first
+    linearized for the PDF reader (BOOK_PDF_LINEARIZE). In the ``lazy`` render
+    mode only the cover is rendered and the BookPage rows are created without
+    an image; the sprite sheets are built by the page grid when it is first
+    opened (see ``rebuild_sprite_sheets``).
+    """
+    if workers is None:
+        workers = get_render_workers()
+    if render_mode is None:
+        render_mode = get_render_mode()
+    if profile is None:
+        profile = get_image_profile(book.genre)
+    extension = get_extension(profile)
+    
+    pdf_path = book.pdf_file.path
+    started_at = time.time()
+    
+    if get_linearize_setting():
+        try:
+            linearize_pdf(pdf_path)
+        except (RuntimeError, ValueError) as e:
+            # E.g. encrypted files; the reader then downloads them whole.
+            logger.warning('Could not linearize the PDF of book %s: %s', book.id, e)
+    
+    doc = fitz.open(pdf_path)
+    try:
+        total_pages = len(doc)
+        img_data = render_page_image(doc, 0, profile)
+    finally:
+        doc.close()
+    
+    cover_filename = hashed_filename(f"cover_{book.id}.{extension}", img_data)
+    cover_path = os.path.join(settings.MEDIA_ROOT, 'books', 'covers', cover_filename)
+    pages_dir = os.path.join(settings.MEDIA_ROOT, 'books', 'pages')
+    filename_template = f"book_{book.id}_page_{{page}}.{extension}"
+    written_paths = [cover_path]
+    
+    try:
+        os.makedirs(os.path.dirname(cover_path), exist_ok=True)
+        write_file(cover_path, img_data)
+        
+        if progress_callback:
+            progress_callback(0, total_pages)
+        
+        pages = []
+        if render_mode == 'lazy':
+            pages = [BookPage(book=book, page_number=page_num + 1) for page_num in range(total_pages)]
+        else:
+            variant_widths = get_variant_widths()
+            rendered_chunks = render_pages(
+                pdf_path, pages_dir, filename_template, total_pages, profile,
+                workers=workers, variant_widths=variant_widths,
+            )
+            for rendered in rendered_chunks:
+                for page in rendered:
+                    pages.append(BookPage(
+                        book=book,
+                        page_number=page['page_number'],
+                        image=f"books/pages/{page['filename']}",
+                        width=page['width'],
+                        height=page['height'],
+                        variants={
+                            name: {
+                                'image': f"books/pages/{variant['filename']}",
+                                'width': variant['width'],
+                                'height': variant['height'],
+                            }
+                            for name, variant in page['variants'].items()
+                        },
+                    ))
+                
+                if progress_callback:
+                    progress_callback(len(pages), total_pages)
+        
+        sprite_sheets = []
+        if render_mode != 'lazy':
+            sprite_sheets, sprite_paths = render_sprite_sheets(book, pdf_path, total_pages, profile)
+            written_paths += sprite_paths
+        page_texts = build_page_texts(book, pdf_path)
+        
+        with transaction.atomic():
+            old_images = [name for page in BookPage.objects.filter(book=book) for name in page.get_image_names()]
+            old_images += PageSpriteSheet.objects.filter(book=book).values_list('image', flat=True)
+            old_images.append(book.cover_image.name if book.cover_image else '')
+            BookPage.objects.filter(book=book).delete()
+            BookPage.objects.bulk_create(pages, batch_size=get_bulk_batch_size())
+            PageSpriteSheet.objects.filter(book=book).delete()
+            PageSpriteSheet.objects.bulk_create(sprite_sheets)
+            replace_page_texts(book, page_texts, batch_size=get_bulk_batch_size())
+            book.cover_image = f'books/covers/{cover_filename}'
+            book.page_count = total_pages
+            book.save(update_fields=['cover_image', 'page_count', 'updated_at'])
+    except BaseException:
+        # Hashed page names are only known once a page is rendered, and a
+        # failing worker reports none of its pages, so look for them.
+        written_paths += glob.glob(os.path.join(pages_dir, glob.escape(f"book_{book.id}_page_") + '*'))
+        _remove_files_written_since(written_paths, started_at)
+        raise
+    
+    # Files of a previous rendering that were not overwritten, e.g. after
+    # the image format changed.
+    new_images = [name for page in pages for name in page.get_image_names()]
+    new_images += [sheet.image.name for sheet in sprite_sheets]
+    _delete_media_files(old_images, keep=new_images + [book.cover_image.name])
+    purge_book(book.id)
+    if progress_callback and render_mode == 'lazy':
+        progress_callback(total_pages, total_pages)
+
+
+def rebuild_sprite_sheets(book, profile=None):
+    """
+    Render the sprite sheets of an already processed book again, e.g. for
+    books ingested before sprite sheets existed or after the sprite settings
+    changed. Returns the number of sheets.
+    """
+    if profile is None:
+        profile = get_image_profile(book.genre)
+    started_at = time.time()
+    
+    sprite_sheets, written_paths = render_sprite_sheets(book, book.pdf_file.path, book.page_count, profile)
+    try:
+        with transaction.atomic():
+            old_images = list(PageSpriteSheet.objects.filter(book=book).values_list('image', flat=True))
+            PageSpriteSheet.objects.filter(book=book).delete()
+            PageSpriteSheet.objects.bulk_create(sprite_sheets)
+    except BaseException:
+        _remove_files_written_since(written_paths, started_at)
+        raise
+    
+    _delete_media_files(old_images, keep=[sheet.image.name for sheet in sprite_sheets])
+    return len(sprite_sheets)
+
+
+def transcode_page_images(book, profile=None):
+    """
+    Re-encode the book's existing page, variant, sprite sheet and cover
+    images with ``profile`` without going back to the PDF. The resolution is kept as is,
+    so only the codec and quality of the profile apply. Returns the number of
+    re-encoded pages.
+    """
+    if profile is None:
+        profile = get_image_profile(book.genre)
+    extension = get_extension(profile)
+    started_at = time.time()
+    
+    def renamed(name, img_data):
+        directory, filename = posixpath.split(name)
+        root = os.path.splitext(split_hashed_filename(filename)[0])[0]
+        return posixpath.join(directory, hashed_filename(f"{root}.{extension}", img_data))
+    
+    pages = list(BookPage.objects.filter(book=book).exclude(image=''))
+    sprite_sheets = list(PageSpriteSheet.objects.filter(book=book))
+    old_names = [name for page in pages for name in page.get_image_names()]
+    old_names += [sheet.image.name for sheet in sprite_sheets]
+    if book.cover_image:
+        old_names.append(book.cover_image.name)
+    
+    new_names = {}
+    written_paths = []
+    try:
+        for old_name in old_names:
+            with Image.open(os.path.join(settings.MEDIA_ROOT, old_name)) as image:
+                image.load()
+                img_data = encode_image(image.convert('RGB'), profile)
+            
+            new_name = renamed(old_name, img_data)
+            new_path = os.path.join(settings.MEDIA_ROOT, new_name)
+            written_paths.append(new_path)
+            write_file(new_path, img_data)
+            new_names[old_name] = new_name
+        
+        for page in pages:
+            page.image = new_names[page.image.name]
+            for variant in page.variants.values():
+                variant['image'] = new_names[variant['image']]
+        for sheet in sprite_sheets:
+            sheet.image = new_names[sheet.image.name]
+        if book.cover_image:
+            book.cover_image = new_names[book.cover_image.name]
+        
+        with transaction.atomic():
+            BookPage.objects.bulk_update(pages, ['image', 'variants'], batch_size=get_bulk_batch_size())
+            PageSpriteSheet.objects.bulk_update(sprite_sheets, ['image'])
+            if book.cover_image:
+                book.save(update_fields=['cover_image', 'updated_at'])
+    except BaseException:
+        _remove_files_written_since(written_paths, started_at)
+        raise
+    
+    _delete_media_files(old_names, keep=new_names.values())
+    purge_book(book.id)
+    return len(pages)
@@ -0,0 +1,125 @@
+"""
+Collaborative "readers who liked this also liked" recommendations.
+
+``build_recommendations()`` reads the (user, book) pairs of ``Favorite`` as
+plain integers, builds a sparse user x book matrix and computes the item-item
+co-occurrence matrix with sparse products, one block of books at a time.
+Scores are cosine similarities of the books' favorite columns::
+
+    score(a, b) = co_favorites(a, b) / sqrt(favorites(a) * favorites(b))
+
+The top BOOK_RECOMMENDATIONS_COUNT books per book are stored in
+``BookRecommendation`` so the detail page reads them with one query. Run it
+periodically with ``python manage.py build_recommendations``.
+"""
+from array import array
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .catalog_cache import bump_catalog_version
+from .models import BookRecommendation, Favorite
+
+# Books whose co-occurrence rows are computed at once.
+BLOCK_SIZE = 2048
+
+FETCH_SIZE = 10000
+
+
+def get_recommendation_settings():
+    return {
+        'count': getattr(settings, 'BOOK_RECOMMENDATIONS_COUNT', 6),
+        'min_co_favorites': getattr(settings, 'BOOK_RECOMMENDATIONS_MIN_CO_FAVORITES', 2),
+    }
+
+
+def load_favorite_matrix():
+    """
+    Return ``(book_ids, matrix)``: a CSR user x book matrix of ones with a
+    column per favorited book. Rows are read as integer pairs into compact
+    arrays, never as model instances.
+    """
+    user_ids = array('q')
+    book_ids = array('q')
+    pairs = Favorite.objects.order_by().values_list('user_id', 'book_id').iterator(chunk_size=FETCH_SIZE)
+    for user_id, book_id in pairs:
+        user_ids.append(user_id)
+        book_ids.append(book_id)
+
+    if not book_ids:
+        return [], sparse.csr_matrix((0, 0), dtype=np.float32)
+
+    users, user_rows = np.unique(np.frombuffer(user_ids, dtype=np.int64), return_inverse=True)
+    columns_book_ids, book_columns = np.unique(np.frombuffer(book_ids, dtype=np.int64), return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(book_columns), dtype=np.float32), (user_rows, book_columns)),
+        shape=(len(users), len(columns_book_ids)),
+    )
+    return columns_book_ids.tolist(), matrix
+
+
+def compute_recommendations(matrix, count, min_co_favorites):
+    """
+    Yield ``(column, [(other_column, score, co_favorites), ...])`` for every
+    book column, best first.
+    """
+    by_book = matrix.T.tocsr()
+    favorite_counts = np.asarray(by_book.sum(axis=1)).ravel()
+
+    for start in range(0, by_book.shape[0], BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, by_book.shape[0])
+        co_occurrence = (by_book[start:stop] @ matrix).tocsr()
+        for offset in range(stop - start):
+            column = start + offset
+            row_start, row_end = co_occurrence.indptr[offset], co_occurrence.indptr[offset + 1]
+            others = co_occurrence.indices[row_start:row_end]
+            counts = co_occurrence.data[row_start:row_end]
+
+            keep = (others != column) & (counts >= min_co_favorites)
+            others = others[keep]
+            counts = counts[keep]
+            if not len(others):
+                yield column, []
+                continue
+
+            scores = counts / np.sqrt(favorite_counts[column] * favorite_counts[others])
+            if len(scores) > count:
+                top = np.argpartition(-scores, count - 1)[:count]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            yield column, [(int(others[i]), float(scores[i]), int(counts[i])) for i in top]
+
+
+def build_recommendations():
+    """
+    Recompute and replace all stored recommendations. Returns the number of
+    books that have recommendations.
+    """
+    options = get_recommendation_settings()
+    book_ids, matrix = load_favorite_matrix()
+
+    entries = []
+    recommended_books = 0
+    if book_ids:
+        for column, recommended in compute_recommendations(matrix, options['count'], options['min_co_favorites']):
+            if recommended:
+                recommended_books += 1
+            entries.extend(
+                BookRecommendation(
+                    book_id=book_ids[column],
+                    recommended_book_id=book_ids[other],
+                    rank=rank,
+                    score=score,
+                    co_favorites=co_favorites,
+                )
+                for rank, (other, score, co_favorites) in enumerate(recommended, start=1)
+            )
+
+    with transaction.atomic():
+        BookRecommendation.objects.all().delete()
+        BookRecommendation.objects.bulk_create(entries, batch_size=1000)
+    bump_catalog_version()
+    return recommended_books
@@ -0,0 +1,253 @@
+"""
+PDF page rendering engine.
+
+This module only depends on PyMuPDF and Pillow so that it can be imported by
+process pool workers without setting up Django. Image profiles are the plain
+dicts described in ``books.image_profiles``.
+"""
+import hashlib
+import io
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+
+def split_page_range(total_pages, chunks):
+    """
+    Split ``range(total_pages)`` into at most ``chunks`` contiguous
+    ``(start, stop)`` ranges of nearly equal size.
+    """
+    chunks = max(1, min(chunks, total_pages))
+    size, remainder = divmod(total_pages, chunks)
+    ranges = []
+    start = 0
+    for index in range(chunks):
+        stop = start + size + (1 if index < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def encode_image(image, profile):
+    """
+    Encode a Pillow image with the codec and quality of ``profile``.
+    """
+    buffer = io.BytesIO()
+    image_format = profile['format']
+    if image_format == 'png':
+        image.save(buffer, format='PNG', optimize=True)
+    elif image_format == 'jpeg':
+        image.convert('RGB').save(buffer, format='JPEG', quality=profile['quality'], optimize=True, progressive=True)
+    elif image_format == 'webp':
+        image.save(buffer, format='WEBP', quality=profile['quality'], method=4)
+    else:
+        raise ValueError(f"Unsupported page image format: {image_format}")
+    return buffer.getvalue()
+
+
+def render_page_image(doc, page_index, profile):
+    """
+    Render one page of an open document at the profile's DPI and return the
+    encoded image bytes.
+    """
+    pix = doc[page_index].get_pixmap(dpi=profile['dpi'])
+    if profile['format'] == 'png':
+        return pix.tobytes("png")
+    image = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+    return encode_image(image, profile)
+
+
+# Hex digits of the content hash in the names of rendered files.
+HASH_LENGTH = 12
+
+
+def hashed_filename(filename, data):
+    """
+    Name a rendered file after its content: ``book_1_page_2.webp`` becomes
+    ``book_1_page_2.<hash>.webp``. The bytes behind such a name never
+    change, so its URL can be cached forever.
+    """
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{extension}"
+
+
+def split_hashed_filename(filename):
+    """
+    Return ``(filename, hash)`` with the content hash taken out of a name
+    made by ``hashed_filename``. ``hash`` is ``None`` for other names.
+    """
+    root, extension = os.path.splitext(filename)
+    base, dot, digest = root.rpartition('.')
+    if dot and len(digest) == HASH_LENGTH and all(char in '0123456789abcdef' for char in digest):
+        return f"{base}{extension}", digest
+    return filename, None
+
+
+def write_file(path, data):
+    """
+    Write ``data`` to ``path`` through a temporary file, so readers never see
+    a partial file. An existing file is left alone: under a content-hashed
+    name it already holds the same bytes.
+    """
+    if os.path.exists(path):
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def variant_filename(filename, variant):
+    """
+    Name of a size variant of a page image: ``book_1_page_2.webp`` becomes
+    ``book_1_page_2_mobile.webp``.
+    """
+    root, extension = os.path.splitext(filename)
+    return f"{root}_{variant}{extension}"
+
+
+def render_page_variants(doc, page_index, profile, variant_widths):
+    """
+    Render one page once and encode it at the profile's DPI plus one image
+    per entry of ``variant_widths`` (``{name: width_in_pixels}``).
+
+    The page is rasterized at whatever resolution the widest variant needs
+    and scaled down with Pillow for every output, so the PDF is only
+    rasterized a single time. Variants as wide as the main image are
+    skipped. Returns ``(image, variants)`` where
+    ``image`` is ``(bytes, width, height)`` and ``variants`` maps variant
+    names to the same kind of tuple.
+    """
+    page = doc[page_index]
+    zoom = profile['dpi'] / 72
+    main_size = (round(page.rect.width * zoom), round(page.rect.height * zoom))
+    render_zoom = max([zoom] + [width / page.rect.width for width in variant_widths.values()])
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(render_zoom, render_zoom))
+    source = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+
+    main_image = source if source.size == main_size else source.resize(main_size, Image.LANCZOS)
+    image = (encode_image(main_image, profile), main_image.width, main_image.height)
+
+    variants = {}
+    for name, width in variant_widths.items():
+        if width == main_image.width:
+            continue
+        height = round(source.height * width / source.width)
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        variants[name] = (encode_image(resized, profile), width, height)
+    return image, variants
+
+
+def render_sprite_sheet(pdf_path, start, stop, tile_width, columns, profile):
+    """
+    Render pages ``start`` to ``stop - 1`` as ``tile_width`` pixel wide
+    thumbnails and pack them row by row into one sprite sheet image.
+
+    All cells share the height of the tallest thumbnail; shorter pages are
+    aligned to the top of their cell. Returns ``(bytes, tile_height)``.
+    """
+    tiles = []
+    doc = fitz.open(pdf_path)
+    try:
+        for page_index in range(start, stop):
+            page = doc[page_index]
+            zoom = tile_width / page.rect.width
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            tile = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+            if tile.width != tile_width:
+                tile = tile.resize((tile_width, round(tile.height * tile_width / tile.width)), Image.LANCZOS)
+            tiles.append(tile)
+    finally:
+        doc.close()
+
+    tile_height = max(tile.height for tile in tiles)
+    sheet_columns = min(columns, len(tiles))
+    sheet_rows = math.ceil(len(tiles) / columns)
+    sheet = Image.new('RGB', (sheet_columns * tile_width, sheet_rows * tile_height), 'white')
+    for index, tile in enumerate(tiles):
+        sheet.paste(tile, ((index % columns) * tile_width, (index // columns) * tile_height))
+    return encode_image(sheet, profile), tile_height
+
+
+def iter_page_range(pdf_path, output_dir, filename_template, start, stop, profile, variant_widths=None):
+    """
+    Render pages ``start`` to ``stop - 1`` of a PDF to image files, yielding a
+    dict after each page::
+
+        {'page_number': 1, 'filename': ..., 'width': ..., 'height': ...,
+         'variants': {name: {'filename': ..., 'width': ..., 'height': ...}}}
+
+    ``page_number`` is 1-based. Files are named by ``filename_template`` plus
+    their content hash (see ``hashed_filename``). See
+    ``render_page_variants`` for ``variant_widths``.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        for page_index in range(start, stop):
+            base_filename = filename_template.format(page=page_index + 1)
+            (img_data, width, height), variants = render_page_variants(doc, page_index, profile, variant_widths or {})
+            filename = hashed_filename(base_filename, img_data)
+            write_file(os.path.join(output_dir, filename), img_data)
+
+            rendered_variants = {}
+            for name, (variant_data, variant_width, variant_height) in variants.items():
+                name_on_disk = hashed_filename(variant_filename(base_filename, name), variant_data)
+                write_file(os.path.join(output_dir, name_on_disk), variant_data)
+                rendered_variants[name] = {'filename': name_on_disk, 'width': variant_width, 'height': variant_height}
+
+            yield {
+                'page_number': page_index + 1,
+                'filename': filename,
+                'width': width,
+                'height': height,
+                'variants': rendered_variants,
+            }
+    finally:
+        doc.close()
+
+
+def render_page_range(pdf_path, output_dir, filename_template, start, stop, profile, variant_widths=None):
+    """
+    Render a page range and return the list of page dicts (see
+    ``iter_page_range``). Every call opens its own document, so ranges can be
+    rendered in separate processes.
+    """
+    return list(iter_page_range(pdf_path, output_dir, filename_template, start, stop, profile, variant_widths))
+
+
+def render_pages(pdf_path, output_dir, filename_template, total_pages, profile, workers=1, variant_widths=None):
+    """
+    Render every page of a PDF with the given image profile, spreading the
+    page range over ``workers`` processes.
+
+    Yields lists of page dicts (see ``iter_page_range``) as each chunk of
+    pages is finished, in completion order. With a single worker the pages
+    are rendered in the calling process.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or 1, total_pages))
+
+    if workers == 1:
+        for rendered in iter_page_range(pdf_path, output_dir, filename_template, 0, total_pages, profile, variant_widths):
+            yield [rendered]
+        return
+
+    # Several chunks per worker keep the pool busy when some pages are much
+    # heavier than others and give more frequent progress updates.
+    ranges = split_page_range(total_pages, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(render_page_range, pdf_path, output_dir, filename_template, start, stop, profile, variant_widths)
+            for start, stop in ranges
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,244 @@
+"""
+Full-text search over the text extracted from the books' PDFs.
+
+Page texts are stored in ``BookPageText``; page number 0 holds the book's
+metadata so that titles and descriptions are found through the same index.
+The search itself goes through a backend chosen with BOOK_SEARCH_BACKEND:
+
+* ``SQLiteFTS5Backend`` queries the FTS5 index created by migration 0006,
+  ranked with bm25 and with highlighted snippets.
+* ``DatabaseSearchBackend`` works on any database with ``icontains`` lookups
+  and is used when the FTS5 index is not available.
+"""
+import fitz  # PyMuPDF
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import BookPageText
+from .text import get_text_pipeline
+
+FTS_TABLE = 'books_bookpagetext_fts'
+
+# Control characters used to mark highlights in snippets before escaping.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+def iter_page_texts(pdf_path, max_pages=None):
+    """
+    Yield ``(page_number, text)`` for the pages of a PDF, one page at a time,
+    stopping after ``max_pages`` pages when given.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        page_total = len(doc) if not max_pages else min(max_pages, len(doc))
+        for page_index in range(page_total):
+            yield page_index + 1, doc[page_index].get_text()
+    finally:
+        doc.close()
+
+
+def get_metadata_text(book):
+    return '\n'.join([book.title, book.author, str(book.year), book.description])
+
+
+def build_page_texts(book, pdf_path=None):
+    """
+    Extract the text of every page of the book's PDF as unsaved
+    BookPageText objects. Pages without text are skipped.
+    """
+    return [
+        BookPageText(book=book, page_number=page_number, text=text)
+        for page_number, text in iter_page_texts(pdf_path or book.pdf_file.path)
+        if text.strip()
+    ]
+
+
+def replace_page_texts(book, page_texts, batch_size=500):
+    """
+    Replace the indexed page texts of a book. Should run inside the ingest
+    transaction so the index never shows a half-indexed book.
+    """
+    BookPageText.objects.filter(book=book, page_number__gt=0).delete()
+    BookPageText.objects.bulk_create(page_texts, batch_size=batch_size)
+
+
+def index_book_metadata(book):
+    """
+    Store the book's metadata as page 0 of its indexed text.
+    """
+    BookPageText.objects.update_or_create(
+        book=book,
+        page_number=0,
+        defaults={'text': get_metadata_text(book)},
+    )
+
+
+def index_book(book):
+    """
+    (Re)index the metadata and all page texts of a book.
+    """
+    page_texts = build_page_texts(book)
+    with transaction.atomic():
+        replace_page_texts(book, page_texts)
+        index_book_metadata(book)
+    return len(page_texts)
+
+
+def format_snippet(snippet):
+    """
+    Escape a snippet and turn the highlight markers into ``<mark>`` tags.
+    """
+    html = escape(snippet)
+    html = html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
+
+
+class SearchHit:
+    """
+    A book matching a query, with the best matching pages. Page 0 means the
+    match was in the book's metadata.
+    """
+
+    def __init__(self, book_id, score):
+        self.book_id = book_id
+        self.score = score
+        self.pages = []
+
+    def add_page(self, page_number, snippet):
+        self.pages.append({'page_number': page_number, 'snippet': snippet})
+
+    @property
+    def text_pages(self):
+        return [page for page in self.pages if page['page_number'] > 0]
+
+
+class BaseSearchBackend:
+    max_pages_per_book = 3
+
+    def search(self, query, limit=200):
+        """
+        Return a list of SearchHit objects, best match first.
+        """
+        raise NotImplementedError
+
+    def get_terms(self, query):
+        return get_text_pipeline().words(query)
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    snippet_tokens = 12
+
+    def build_match_expression(self, terms):
+        # Every term is quoted so user input can never be parsed as FTS5
+        # query syntax; the last term also matches as a prefix.
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, query, limit=200):
+        terms = self.get_terms(query)
+        if not terms:
+            return []
+
+        sql = f"""
+            SELECT t.book_id, t.page_number,
+                   snippet({FTS_TABLE}, 0, %s, %s, '…', %s),
+                   bm25({FTS_TABLE}) AS rank
+            FROM {FTS_TABLE}
+            JOIN books_bookpagetext t ON t.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s
+            ORDER BY rank
+            LIMIT %s
+        """
+        # Several pages can match per book, so fetch more rows than books.
+        params = [
+            HIGHLIGHT_START, HIGHLIGHT_END, self.snippet_tokens,
+            self.build_match_expression(terms), limit * self.max_pages_per_book,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        hits = {}
+        for book_id, page_number, snippet, rank in rows:
+            hit = hits.get(book_id)
+            if hit is None:
+                if len(hits) >= limit:
+                    continue
+                # bm25() is lower for better matches.
+                hit = hits[book_id] = SearchHit(book_id, -rank)
+            if len(hit.pages) < self.max_pages_per_book:
+                hit.add_page(page_number, format_snippet(snippet))
+        return list(hits.values())
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    snippet_chars = 80
+
+    def make_snippet(self, text, term):
+        index = text.lower().find(term)
+        if index < 0:
+            return format_snippet(text[:self.snippet_chars])
+        start = max(0, index - self.snippet_chars // 2)
+        end = index + len(term) + self.snippet_chars // 2
+        snippet = (
+            text[start:index] + HIGHLIGHT_START + text[index:index + len(term)]
+            + HIGHLIGHT_END + text[index + len(term):end]
+        )
+        return format_snippet(('…' if start else '') + snippet + ('…' if end < len(text) else ''))
+
+    def search(self, query, limit=200):
+        terms = self.get_terms(query)
+        if not terms:
+            return []
+
+        page_texts = BookPageText.objects.all()
+        for term in terms:
+            page_texts = page_texts.filter(text__icontains=term)
+
+        hits = {}
+        for book_id, page_number, text in page_texts.order_by('book_id', 'page_number').values_list('book_id', 'page_number', 'text').iterator():
+            hit = hits.get(book_id)
+            if hit is None:
+                hit = hits[book_id] = SearchHit(book_id, 0)
+            # Rank by the number of matching pages, metadata counting double.
+            hit.score += 2 if page_number == 0 else 1
+            if len(hit.pages) < self.max_pages_per_book:
+                hit.add_page(page_number, self.make_snippet(text, terms[0]))
+
+        return sorted(hits.values(), key=lambda hit: -hit.score)[:limit]
+
+
+_fts5_available = None
+
+
+def fts5_available():
+    """
+    Whether the FTS5 index exists; checked once per process.
+    """
+    global _fts5_available
+    if _fts5_available is None:
+        _fts5_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts5_available
+
+
+def get_search_backend():
+    """
+    Instantiate BOOK_SEARCH_BACKEND, falling back to DatabaseSearchBackend
+    when the FTS5 index does not exist on the current database.
+    """
+    backend_path = getattr(settings, 'BOOK_SEARCH_BACKEND', 'books.search.SQLiteFTS5Backend')
+    backend_class = import_string(backend_path)
+    if issubclass(backend_class, SQLiteFTS5Backend) and not fts5_available():
+        backend_class = DatabaseSearchBackend
+    return backend_class()
+
+
+def search_books(query, limit=200):
+    return get_search_backend().search(query, limit=limit)
@@ -0,0 +1,130 @@
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from .models import Book, BookPage
+
+GENRE_LABELS = dict(Book.GENRE_CHOICES)
+
+# API field name -> (columns it is built from, function of the row). Fields
+# without a function are the column of the same name.
+BOOK_FIELDS = {
+    'id': (['id'], None),
+    'title': (['title'], None),
+    'author': (['author'], None),
+    'year': (['year'], None),
+    'genre': (['genre'], None),
+    'genre_display': (['genre'], lambda row: GENRE_LABELS.get(row['genre'], row['genre'])),
+    'description': (['description'], None),
+    'keywords': (['keywords'], None),
+    'page_count': (['page_count'], None),
+    'cover_url': (['cover_image'], lambda row: default_storage.url(row['cover_image']) if row['cover_image'] else None),
+    'pdf_url': (['id'], lambda row: reverse('books:pdf', args=[row['id']])),
+    'is_favorite': (['is_favorite'], None),
+    'created_at': (['created_at'], None),
+    'updated_at': (['updated_at'], None),
+}
+
+# API field name -> columns of the page it is built from.
+PAGE_FIELDS = {
+    'number': ['page_number'],
+    'url': ['image', 'page_number'],
+    'srcset': ['image', 'page_number', 'width', 'variants'],
+    'width': ['width'],
+    'height': ['height'],
+    'variants': ['variants'],
+}
+
+
+def get_book_columns(fields):
+    """
+    The ``.values()`` columns needed for ``fields``. ``id`` and
+    ``created_at`` are always read, for cursors and batched lookups.
+    """
+    columns = {'id', 'created_at'}
+    for field in fields:
+        columns.update(BOOK_FIELDS[field][0])
+    return sorted(columns)
+
+
+def serialize_book(row, fields):
+    """
+    Compact dict with the ``fields`` of one book, built from a ``Book``
+    ``.values()`` row.
+    """
+    data = {}
+    for field in fields:
+        columns, build = BOOK_FIELDS[field]
+        data[field] = build(row) if build else row[field]
+    return data
+
+
+def get_page_columns(fields):
+    """
+    The ``BookPage`` ``.values()`` columns needed for ``fields``.
+    ``page_number`` is always read, for cursors and batched lookups.
+    """
+    columns = {'page_number'}
+    for field in fields:
+        columns.update(PAGE_FIELDS[field])
+    return sorted(columns)
+
+
+def get_page_url(book_id, row):
+    if row['image']:
+        return default_storage.url(row['image'])
+    return reverse('books:page_image', args=[book_id, row['page_number']])
+
+
+def get_page_variants(row):
+    return {
+        name: {
+            'url': default_storage.url(variant['image']),
+            'width': variant['width'],
+            'height': variant['height'],
+        }
+        for name, variant in (row['variants'] or {}).items()
+    }
+
+
+def get_page_srcset(book_id, row):
+    if not row['width']:
+        return ''
+    candidates = [(variant['width'], variant['url']) for variant in get_page_variants(row).values()]
+    candidates.append((row['width'], get_page_url(book_id, row)))
+    return ', '.join(f"{candidate_url} {width}w" for width, candidate_url in sorted(candidates))
+
+
+def serialize_page(book_id, row, fields=None):
+    """
+    Compact dict for one page, built from a ``BookPage`` ``.values()`` row.
+    With ``fields`` only those are built, and the row only needs the
+    columns of ``get_page_columns(fields)``.
+    """
+    builders = {
+        'number': lambda: row['page_number'],
+        'url': lambda: get_page_url(book_id, row),
+        'srcset': lambda: get_page_srcset(book_id, row),
+        'width': lambda: row['width'],
+        'height': lambda: row['height'],
+        'variants': lambda: get_page_variants(row),
+    }
+    return {field: builders[field]() for field in fields or PAGE_FIELDS}
+
+
+def serialize_page_manifest(book):
+    """
+    Everything a client-side reader needs to page through a book without
+    further requests to Django: all page URLs, srcsets and dimensions.
+    """
+    rows = BookPage.objects.filter(book_id=book.id).order_by('page_number').values(
+        'page_number', 'image', 'width', 'height', 'variants'
+    )
+    pages = [serialize_page(book.id, row) for row in rows]
+    
+    return {
+        'book_id': book.id,
+        'title': book.title,
+        'page_count': len(pages),
+        'version': int(book.updated_at.timestamp()),
+        'pages': pages,
+    }
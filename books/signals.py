@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog_cache import bump_catalog_version
+from .models import Book
+from .search import index_book_metadata
+
+
+@receiver(post_save, sender=Book)
+def update_search_metadata(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_book_metadata(instance)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
@@ -0,0 +1,174 @@
+"""
+Precomputed "similar books" index.
+
+Books are compared by the cosine similarity of their stored LDA topic vectors
+(see ``books.topics``). The ``BOOK_SIMILAR_BOOKS_COUNT`` nearest neighbours of
+every book are stored as ``SimilarBook`` rows, so the detail page reads them
+with one indexed query.
+
+``update_similar_books()`` only recomputes the books whose topic vector
+changed since their neighbours were stored, plus the books whose lists
+reference them, may now include them or lost an entry to a deleted book.
+When and how many neighbours were stored is kept on each book's
+``BookTopicVector``, so a short list (few books, few positive scores) is
+not mistaken for a damaged one.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .catalog_cache import bump_catalog_version
+from .models import BookTopicVector, SimilarBook
+
+# Rows of the similarity matrix computed at once; bounds memory to
+# BLOCK_SIZE x number of books.
+BLOCK_SIZE = 1024
+
+
+def get_similar_books_count():
+    return getattr(settings, 'BOOK_SIMILAR_BOOKS_COUNT', 6)
+
+
+def load_topic_matrix():
+    """
+    Return ``(book_ids, matrix)`` with the L2-normalised topic vector of
+    every book as a row.
+    """
+    book_ids = []
+    vectors = []
+    for book_id, vector in BookTopicVector.objects.order_by('book_id').values_list('book_id', 'vector').iterator():
+        book_ids.append(book_id)
+        vectors.append(np.frombuffer(bytes(vector), dtype=np.float32))
+    if not vectors:
+        return book_ids, np.zeros((0, 0), dtype=np.float32)
+
+    matrix = np.vstack(vectors)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return book_ids, matrix / norms
+
+
+def top_k_neighbours(matrix, rows, k):
+    """
+    Yield ``(row, [(column, score), ...])`` with the ``k`` most similar other
+    rows of each row in ``rows``, best first.
+    """
+    k = min(k, matrix.shape[0] - 1)
+    if k <= 0:
+        for row in rows:
+            yield row, []
+        return
+
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = np.asarray(rows[start:start + BLOCK_SIZE])
+        similarities = matrix[block] @ matrix.T
+        similarities[np.arange(len(block)), block] = -np.inf
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        for i, row in enumerate(block):
+            yield int(row), [
+                (int(top[i, j]), float(top_scores[i, j]))
+                for j in order[i]
+                if top_scores[i, j] > 0
+            ]
+
+
+def store_neighbours(book_ids, matrix, rows, k, indexed_at):
+    """
+    Recompute and replace the stored neighbours of the books at ``rows``,
+    recording ``indexed_at`` (taken before the vectors were read) and the
+    number of neighbours on their topic vectors.
+    """
+    entries = []
+    books_by_count = defaultdict(list)
+    for row, neighbours in top_k_neighbours(matrix, rows, k):
+        entries.extend(
+            SimilarBook(book_id=book_ids[row], similar_book_id=book_ids[column], rank=rank, score=score)
+            for rank, (column, score) in enumerate(neighbours, start=1)
+        )
+        books_by_count[len(neighbours)].append(book_ids[row])
+    with transaction.atomic():
+        SimilarBook.objects.filter(book_id__in=[book_ids[row] for row in rows]).delete()
+        SimilarBook.objects.bulk_create(entries, batch_size=500)
+        # One UPDATE per list length; update() leaves updated_at alone.
+        for count, ids in books_by_count.items():
+            BookTopicVector.objects.filter(book_id__in=ids).update(similar_indexed_at=indexed_at, similar_count=count)
+
+
+def find_stale_rows(book_ids, matrix, k):
+    """
+    Rows of the books whose stored neighbours may be out of date.
+    """
+    positions = {book_id: row for row, book_id in enumerate(book_ids)}
+    stored = {
+        entry['book_id']: entry
+        for entry in SimilarBook.objects.values('book_id').annotate(
+            entry_count=Count('id'), min_score=Min('score'),
+        ).order_by()
+    }
+    markers = {
+        book_id: (updated_at, indexed_at, similar_count)
+        for book_id, updated_at, indexed_at, similar_count in BookTopicVector.objects.values_list(
+            'book_id', 'updated_at', 'similar_indexed_at', 'similar_count',
+        )
+    }
+
+    changed = [
+        positions[book_id] for book_id in book_ids
+        if markers[book_id][1] is None or markers[book_id][0] > markers[book_id][1]
+    ]
+    stale = set(changed)
+
+    # Lists cut short by a deleted neighbour.
+    stale.update(
+        positions[book_id] for book_id in book_ids
+        if stored.get(book_id, {}).get('entry_count', 0) < markers[book_id][2]
+    )
+
+    if changed:
+        changed_ids = [book_ids[row] for row in changed]
+        # Lists that contain a changed book...
+        stale.update(
+            positions[book_id]
+            for book_id in SimilarBook.objects.filter(similar_book_id__in=changed_ids).values_list('book_id', flat=True)
+            if book_id in positions
+        )
+        # ...and lists a changed book may now enter.
+        # A list shorter than k takes any positive score.
+        min_scores = np.array([
+            stored[book_id]['min_score'] if stored.get(book_id, {}).get('entry_count', 0) >= k else 0
+            for book_id in book_ids
+        ])
+        for start in range(0, len(changed), BLOCK_SIZE):
+            block = changed[start:start + BLOCK_SIZE]
+            similarities = matrix @ matrix[block].T
+            stale.update(np.flatnonzero((similarities > min_scores[:, None]).any(axis=1)).tolist())
+
+    return sorted(stale)
+
+
+def update_similar_books(full=False):
+    """
+    Bring the stored neighbours up to date. Returns the number of books
+    whose neighbours were recomputed.
+    """
+    k = get_similar_books_count()
+    indexed_at = timezone.now()
+    # Books that lost their topic vector leave the index.
+    SimilarBook.objects.filter(book__topic_vector__isnull=True).delete()
+    SimilarBook.objects.filter(similar_book__topic_vector__isnull=True).delete()
+
+    book_ids, matrix = load_topic_matrix()
+    if not book_ids:
+        return 0
+
+    rows = list(range(len(book_ids))) if full else find_stale_rows(book_ids, matrix, k)
+    if rows:
+        store_neighbours(book_ids, matrix, rows, k, indexed_at)
+        bump_catalog_version()
+    return len(rows)
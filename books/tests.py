@@ -1 +1,807 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .catalog_cache import get_catalog_version
+from .jobs import claim_next_job, enqueue_book_processing, requeue_stale_jobs, retry_job, run_job
+from .models import Book, BookPage, BookPageText, BookTopicVector, Favorite, ProcessingJob, SimilarBook
+from .page_cache import evict, get_cache_dir, get_cached_page
+from .pagination import paginate_keyset
+from .processing import process_pdf_to_images
+from .rendering import split_hashed_filename
+from .search import SQLiteFTS5Backend, index_book_metadata
+from .similarity import update_similar_books
+
+User = get_user_model()
+
+
+def make_pdf(path, page_count):
+    """
+    Write a small PDF with ``page_count`` numbered pages to ``path``.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    doc = fitz.open()
+    for number in range(1, page_count + 1):
+        page = doc.new_page(width=300, height=400)
+        page.insert_text((50, 100), f'Page {number}', fontsize=24)
+    doc.save(path)
+    doc.close()
+
+
+def use_temporary_media_root(test_case):
+    """
+    Point MEDIA_ROOT at an empty directory for the rest of the test.
+    """
+    media_root = tempfile.TemporaryDirectory()
+    test_case.addCleanup(media_root.cleanup)
+    settings_override = override_settings(MEDIA_ROOT=media_root.name)
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+    return media_root.name
+
+
+class CatalogQueryPlanTests(TestCase):
+    """
+    The catalog queries must be answered from the composite indexes, never
+    by scanning ``books_book``. Listings in catalog order must also not sort
+    in a temporary B-tree.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='secret')
+        books = Book.objects.bulk_create(
+            Book(
+                title=f'Book {i}',
+                description='',
+                author=f'Author {i % 4}',
+                year=2000 + i,
+                genre=Book.GENRE_CHOICES[i % 3][0],
+                pdf_file=f'books/pdfs/book{i}.pdf',
+            )
+            for i in range(30)
+        )
+        Favorite.objects.bulk_create(Favorite(user=cls.user, book=book) for book in books[::2])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def catalog_plans(self, **params):
+        """
+        Request the catalog and return the query plan of every query that
+        reads ``books_book``.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books:catalog'), params)
+        self.assertEqual(response.status_code, 200)
+
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if sql.startswith('SELECT') and '"books_book"' in sql:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plans[sql] = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(plans)
+        return response, plans
+
+    def assertUsesIndexes(self, plans, sorted_by_index=True):
+        for sql, plan in plans.items():
+            with self.subTest(sql=sql):
+                for step in plan:
+                    self.assertNotRegex(step, r'^SCAN books_book$', plan)
+                    if sorted_by_index:
+                        self.assertNotIn('TEMP B-TREE', step, plan)
+                self.assertTrue(any('INDEX' in step or 'PRIMARY KEY' in step for step in plan), plan)
+
+    def test_first_page(self):
+        _response, plans = self.catalog_plans()
+        self.assertUsesIndexes(plans)
+
+    def test_genre_pages(self):
+        response, plans = self.catalog_plans(genre='komik')
+        self.assertUsesIndexes(plans)
+        self.assertTrue(any('book_genre_created_idx' in ' '.join(plan) for plan in plans.values()), plans)
+
+        _response, plans = self.catalog_plans(genre='komik', after=response.context['page_obj'].next_cursor, page=2)
+        self.assertUsesIndexes(plans)
+
+        _response, plans = self.catalog_plans(genre='komik', last=1)
+        self.assertUsesIndexes(plans)
+
+    def test_next_and_previous_pages(self):
+        response, plans = self.catalog_plans()
+        response, plans = self.catalog_plans(after=response.context['page_obj'].next_cursor, page=2)
+        self.assertUsesIndexes(plans)
+
+        _response, plans = self.catalog_plans(before=response.context['page_obj'].previous_cursor, page=1)
+        self.assertUsesIndexes(plans)
+
+    def test_favorites(self):
+        # The user's favorite ids come from the session; those books are
+        # looked up by key and only they are sorted, which is cheaper than
+        # walking the whole catalog index.
+        for params in ({'favorites': '1'}, {'favorites': '1', 'genre': 'fiksi'}):
+            _response, plans = self.catalog_plans(**params)
+            self.assertUsesIndexes(plans, sorted_by_index=False)
+            for plan in plans.values():
+                self.assertTrue(plan[0].startswith('SEARCH books_book'), plan)
+
+
+class CatalogQueryCountTests(TestCase):
+    """
+    A catalog page costs the same few queries however many books and
+    favorites it shows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='secret')
+        cls.books = Book.objects.bulk_create(
+            Book(
+                title=f'Book {i}',
+                description='',
+                author='Author',
+                year=2000,
+                genre=Book.GENRE_CHOICES[i % 3][0],
+                pdf_file=f'books/pdfs/book{i}.pdf',
+            )
+            for i in range(12)
+        )
+        Favorite.objects.bulk_create(Favorite(user=cls.user, book=book) for book in cls.books[:3])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('books:catalog')
+
+    def test_catalog(self):
+        # Session, user, count and page; the count is cached afterwards.
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+
+        Favorite.objects.bulk_create(Favorite(user=self.user, book=book) for book in self.books[3:])
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertTrue(all(book.is_favorite for book in response.context['page_obj']))
+
+    def test_genre(self):
+        with self.assertNumQueries(4):
+            self.client.get(self.url, {'genre': 'komik'})
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {'genre': 'komik'})
+
+    def test_favorites_filter(self):
+        self.client.get(self.url, {'favorites': '1'})
+        # The favorite ids now come from the session.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'favorites': '1'})
+        self.assertEqual({book.id for book in response.context['page_obj']}, {book.id for book in self.books[:3]})
+        self.assertEqual(response.context['page_obj'].count, 3)
+
+    def test_toggle_favorite_invalidates_session_ids(self):
+        self.client.get(self.url, {'favorites': '1'})
+        response = self.client.post(reverse('books:toggle_favorite', args=[self.books[0].id]))
+        self.assertEqual(response.json(), {'is_favorite': False})
+
+        response = self.client.get(self.url, {'favorites': '1'})
+        self.assertEqual({book.id for book in response.context['page_obj']}, {book.id for book in self.books[1:3]})
+        self.assertEqual(response.context['page_obj'].count, 2)
+
+
+class MediaViewTests(TestCase):
+    """
+    Media files are only sent to signed-in users, by the front server when
+    one is configured.
+    """
+
+    def setUp(self):
+        media_root = use_temporary_media_root(self)
+        os.makedirs(os.path.join(media_root, 'books', 'pages'))
+        with open(os.path.join(media_root, 'books', 'pages', 'book_1_page_1.0123456789ab.png'), 'wb') as f:
+            f.write(b'page')
+
+        self.user = User.objects.create_user('reader', password='secret')
+        self.url = '/media/books/pages/book_1_page_1.0123456789ab.png'
+
+    def test_requires_login(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_streams_file(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), b'page')
+        self.assertEqual(response['ETag'], '"0123456789ab"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"0123456789ab"')
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(BOOK_MEDIA_SENDFILE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/books/pages/book_1_page_1.0123456789ab.png')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response.content, b'')
+
+    def test_byte_ranges(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1-2')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1-2/4')
+        self.assertEqual(b''.join(response.streaming_content), b'ag')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-0,-1')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges'))
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-')
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1-2', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_outside_media_root(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+class ApiQueryCountTests(TestCase):
+    """
+    Each API endpoint answers with a fixed number of queries, whatever the
+    number of objects and fields asked for.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='secret')
+        cls.books = Book.objects.bulk_create(
+            Book(
+                title=f'Book {i}',
+                description='',
+                author='Author',
+                year=2000,
+                genre=Book.GENRE_CHOICES[i % 3][0],
+                pdf_file=f'books/pdfs/book{i}.pdf',
+            )
+            for i in range(12)
+        )
+        Favorite.objects.bulk_create(Favorite(user=cls.user, book=book) for book in cls.books[:3])
+        BookPage.objects.bulk_create(
+            BookPage(book=cls.books[0], page_number=number, image=f'books/pages/book_page_{number}.png', width=800, height=1000)
+            for number in range(1, 31)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api:books')).status_code, 401)
+
+    def test_books(self):
+        url = reverse('api:books')
+        # Session, user, count and page; the count is cached afterwards.
+        with self.assertNumQueries(4):
+            data = self.client.get(url, {'limit': 5}).json()
+        self.assertEqual(data['count'], 12)
+        self.assertEqual(set(data['results'][0]), {'id', 'title', 'author', 'year', 'genre', 'cover_url', 'page_count'})
+
+        fields = 'id,title,genre_display,cover_url,pdf_url,is_favorite'
+        with self.assertNumQueries(3):
+            data = self.client.get(url, {'limit': 5, 'after': data['next'], 'fields': fields}).json()
+        self.assertEqual([book['id'] for book in data['results']], [book.id for book in reversed(self.books[2:7])])
+        self.assertEqual(list(data['results'][0]), fields.split(','))
+        self.assertTrue(data['results'][-1]['is_favorite'])
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('api:books'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batched_ids(self):
+        book_ids = [book.id for book in self.books[::-2]] + [0]
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('api:books'), {'ids': ','.join(map(str, book_ids)), 'fields': 'id'}).json()
+        self.assertEqual([book['id'] for book in data['results']], book_ids[:-1])
+
+    def test_book(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('api:book', args=[self.books[0].id]), {'fields': 'title'})
+        self.assertEqual(response.json(), {'title': 'Book 0'})
+        self.assertEqual(self.client.get(reverse('api:book', args=[0])).status_code, 404)
+
+    def test_pages(self):
+        url = reverse('api:pages', args=[self.books[0].id])
+        with self.assertNumQueries(3):
+            data = self.client.get(url, {'after': 10, 'fields': 'number,url'}).json()
+        self.assertEqual([page['number'] for page in data['results']], list(range(11, 31)))
+        self.assertEqual(set(data['results'][0]), {'number', 'url'})
+        self.assertIsNone(data['next'])
+
+        with self.assertNumQueries(3):
+            data = self.client.get(url, {'numbers': '7,3,99'}).json()
+        self.assertEqual([page['number'] for page in data['results']], [7, 3])
+
+        self.assertEqual(self.client.get(reverse('api:pages', args=[0])).status_code, 404)
+
+    def test_pages_read_only_requested_columns(self):
+        url = reverse('api:pages', args=[self.books[0].id])
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url, {'numbers': '2', 'fields': 'number,width'}).json()
+        self.assertEqual(data['results'], [{'number': 2, 'width': 800}])
+        sql = queries[-1]['sql']
+        self.assertIn('"width"', sql)
+        self.assertNotIn('"variants"', sql)
+        self.assertNotIn('"image"', sql)
+
+    def test_favorites(self):
+        url = reverse('api:favorites')
+        self.client.get(url)
+        # The favorite ids and the count are cached now.
+        with self.assertNumQueries(3):
+            data = self.client.get(url, {'fields': 'id,is_favorite'}).json()
+        self.assertEqual(data['results'], [{'id': book.id, 'is_favorite': True} for book in reversed(self.books[:3])])
+
+    def test_search(self):
+        for book in self.books:
+            index_book_metadata(book)
+        url = reverse('api:search')
+        # The first search also looks up the search backend.
+        self.client.get(url, {'q': 'book'})
+        # Session, user, search and the books of the hits.
+        with self.assertNumQueries(4):
+            data = self.client.get(url, {'q': 'book', 'limit': 5, 'fields': 'id'}).json()
+        self.assertEqual(data['count'], 12)
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['next'], 5)
+
+
+class PageCacheTests(TestCase):
+    """
+    Lazily rendered pages keep their validators while they stay cached and
+    are evicted least recently used first.
+    """
+
+    def setUp(self):
+        self.media_root = use_temporary_media_root(self)
+        make_pdf(os.path.join(self.media_root, 'books', 'pdfs', 'lazy.pdf'), 2)
+        self.book = Book.objects.create(
+            title='Lazy', description='', author='Author', year=2000, genre='fiksi', pdf_file='books/pdfs/lazy.pdf',
+        )
+        BookPage.objects.create(book=self.book, page_number=1)
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(self.user)
+
+    def test_cache_hit_keeps_validators(self):
+        url = reverse('books:page_image', args=[self.book.id, 1])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_evicts_least_recently_used(self):
+        paths = [get_cached_page(self.book, number) for number in (1, 2)]
+        os.utime(paths[0], (1000, 1000))
+        os.utime(paths[1], (2000, 3000))
+        # A hit makes the first page the most recently used one.
+        get_cached_page(self.book, 1)
+
+        self.assertEqual(evict(max_bytes=os.path.getsize(paths[0])), 1)
+        self.assertEqual(os.listdir(get_cache_dir()), [os.path.basename(paths[0])])
+        self.assertEqual(os.stat(paths[0]).st_mtime, 1000)
+
+
+class ProcessingJobTests(TestCase):
+    """
+    The processing queue hands each book to one worker at a time.
+    """
+
+    def setUp(self):
+        use_temporary_media_root(self)
+        self.book = Book.objects.create(
+            title='Queued', description='', author='Author', year=2000, genre='fiksi', pdf_file='books/pdfs/missing.pdf',
+        )
+
+    def test_enqueue_reuses_pending_and_running_jobs(self):
+        job = enqueue_book_processing(self.book)
+        self.assertEqual(enqueue_book_processing(self.book), job)
+
+        self.assertEqual(claim_next_job(), job)
+        self.assertEqual(enqueue_book_processing(self.book), job)
+
+        ProcessingJob.objects.filter(pk=job.pk).update(status=ProcessingJob.STATUS_DONE)
+        self.assertNotEqual(enqueue_book_processing(self.book), job)
+
+    def test_claim_takes_oldest_pending_job(self):
+        other_book = Book.objects.create(
+            title='Later', description='', author='Author', year=2000, genre='fiksi', pdf_file='books/pdfs/later.pdf',
+        )
+        first = enqueue_book_processing(self.book)
+        enqueue_book_processing(other_book)
+        ProcessingJob.objects.filter(pk=first.pk).update(updated_at=timezone.now() - timedelta(days=1))
+
+        job = claim_next_job()
+        self.assertEqual(job, first)
+        self.assertEqual(job.status, ProcessingJob.STATUS_RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.updated_at, job.started_at)
+
+        self.assertEqual(claim_next_job().book, other_book)
+        self.assertIsNone(claim_next_job())
+
+    def test_failed_job_is_retried_until_max_attempts(self):
+        enqueue_book_processing(self.book)
+        with override_settings(BOOK_PROCESSING_MAX_ATTEMPTS=2), self.assertLogs('books', 'WARNING'):
+            self.assertFalse(run_job(claim_next_job()))
+            job = ProcessingJob.objects.get()
+            self.assertEqual(job.status, ProcessingJob.STATUS_PENDING)
+            self.assertTrue(job.error)
+
+            self.assertFalse(run_job(claim_next_job()))
+            job.refresh_from_db()
+            self.assertEqual(job.status, ProcessingJob.STATUS_FAILED)
+
+        retry_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (ProcessingJob.STATUS_PENDING, 0, ''))
+
+    def test_book_deleted_while_running(self):
+        enqueue_book_processing(self.book)
+        job = claim_next_job()
+
+        def delete_book(book, **kwargs):
+            book.delete()
+            raise RuntimeError('file gone')
+
+        with mock.patch('books.jobs.process_pdf_to_images', side_effect=delete_book), self.assertLogs('books.jobs', 'WARNING'):
+            self.assertFalse(run_job(job))
+        self.assertFalse(ProcessingJob.objects.exists())
+
+    def test_pdf_replaced_while_running(self):
+        enqueue_book_processing(self.book)
+        job = claim_next_job()
+
+        def replace_pdf(book, **kwargs):
+            Book.objects.filter(pk=book.pk).update(pdf_file='books/pdfs/new.pdf')
+
+        with mock.patch('books.jobs.process_pdf_to_images', side_effect=replace_pdf):
+            self.assertTrue(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.STATUS_PENDING)
+
+    def test_requeue_stale_jobs(self):
+        enqueue_book_processing(self.book)
+        job = claim_next_job()
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+        ProcessingJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.STATUS_PENDING)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Paging forward, backward and from the last page meets the same page
+    boundaries, also between books created at the same time.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.bulk_create(
+            Book(title=f'Book {i}', description='', author='Author', year=2000, genre='fiksi', pdf_file=f'books/pdfs/book{i}.pdf')
+            for i in range(12)
+        )
+        # Two groups of books share a creation time.
+        created_at = timezone.now()
+        books = list(Book.objects.order_by('id'))
+        for i, book in enumerate(books):
+            Book.objects.filter(pk=book.pk).update(created_at=created_at + timedelta(seconds=i // 6))
+        cls.ids = list(Book.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def paginate(self, **kwargs):
+        return paginate_keyset(Book.objects.all(), 5, len(self.ids), **kwargs)
+
+    def ids_of(self, page):
+        return [book.id for book in page]
+
+    def test_forward(self):
+        first = self.paginate()
+        self.assertEqual(self.ids_of(first), self.ids[:5])
+        self.assertFalse(first.has_previous)
+        second = self.paginate(after=first.next_cursor, number=2)
+        self.assertEqual(self.ids_of(second), self.ids[5:10])
+        third = self.paginate(after=second.next_cursor, number=3)
+        self.assertEqual(self.ids_of(third), self.ids[10:])
+        self.assertFalse(third.has_next)
+
+    def test_last_and_backward(self):
+        last = self.paginate(last=True)
+        self.assertEqual(last.number, 3)
+        self.assertEqual(self.ids_of(last), self.ids[10:])
+        self.assertFalse(last.has_next)
+
+        second = self.paginate(before=last.previous_cursor, number=2)
+        self.assertEqual(self.ids_of(second), self.ids[5:10])
+        self.assertTrue(second.has_previous)
+        first = self.paginate(before=second.previous_cursor, number=1)
+        self.assertEqual(self.ids_of(first), self.ids[:5])
+        self.assertFalse(first.has_previous)
+
+    def test_last_page_when_full(self):
+        page = paginate_keyset(Book.objects.all(), 4, len(self.ids), last=True)
+        self.assertEqual(self.ids_of(page), self.ids[8:])
+        self.assertEqual(page.number, 3)
+
+    def test_invalid_cursor_gives_first_page(self):
+        page = self.paginate(after='not a cursor')
+        self.assertEqual(self.ids_of(page), self.ids[:5])
+        self.assertEqual(page.number, 1)
+
+
+class SearchIndexTests(TestCase):
+    """
+    The FTS5 index follows BookPageText through its triggers and queries are
+    ranked, highlighted and never parsed as FTS5 syntax.
+    """
+
+    def setUp(self):
+        self.backend = SQLiteFTS5Backend()
+        self.book = self.create_book('Atlas')
+
+    def create_book(self, title):
+        return Book.objects.create(
+            title=title, description='', author='Author', year=2000, genre='fiksi', pdf_file='books/pdfs/book.pdf',
+        )
+
+    def pages_for(self, query):
+        return [(hit.book_id, page['page_number']) for hit in self.backend.search(query) for page in hit.pages]
+
+    def test_triggers_keep_index_in_sync(self):
+        page_text = BookPageText.objects.create(book=self.book, page_number=1, text='the quick brown fox')
+        self.assertEqual(self.pages_for('brown'), [(self.book.id, 1)])
+
+        page_text.text = 'a lazy dog'
+        page_text.save()
+        self.assertEqual(self.pages_for('brown'), [])
+        self.assertEqual(self.pages_for('lazy'), [(self.book.id, 1)])
+
+        page_text.delete()
+        self.assertEqual(self.pages_for('lazy'), [])
+
+    def test_metadata_is_page_zero(self):
+        self.book.title = 'Ensiklopedia'
+        self.book.save()
+        self.assertEqual(self.pages_for('ensiklopedia'), [(self.book.id, 0)])
+        self.assertEqual(self.pages_for('atlas'), [])
+
+    def test_ranking(self):
+        other = self.create_book('Other')
+        BookPageText.objects.create(book=other, page_number=1, text='zebra ' + 'filler words here ' * 20)
+        BookPageText.objects.create(book=self.book, page_number=1, text='zebra zebra zebra')
+        hits = self.backend.search('zebra')
+        self.assertEqual([hit.book_id for hit in hits], [self.book.id, other.id])
+        self.assertGreater(hits[0].score, hits[1].score)
+
+    def test_prefix_match_on_last_term(self):
+        BookPageText.objects.create(book=self.book, page_number=1, text='photosynthesis in plants')
+        self.assertEqual(self.pages_for('photo'), [(self.book.id, 1)])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        BookPageText.objects.create(book=self.book, page_number=1, text='<b>bold</b> claims about zebra stripes')
+        snippet = self.backend.search('zebra')[0].pages[0]['snippet']
+        self.assertIn('<mark>zebra</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+        self.assertNotIn('<b>', snippet)
+
+    def test_hostile_queries(self):
+        BookPageText.objects.create(book=self.book, page_number=1, text='hello world, a b c')
+        self.assertEqual(self.pages_for('hello OR'), [])
+        self.assertEqual(self.pages_for('a"b'), [(self.book.id, 1)])
+        for query in ['*', '"', 'NEAR(', 'text:hello', '-', '^hello', 'AND']:
+            with self.subTest(query=query):
+                self.backend.search(query)
+
+
+@override_settings(
+    BOOK_PAGE_IMAGE_PROFILES={'default': {'format': 'webp', 'quality': 80, 'dpi': 72}},
+    BOOK_PAGE_VARIANT_WIDTHS={},
+)
+class IngestTests(TestCase):
+    """
+    Rendering a small generated PDF into a temporary MEDIA_ROOT.
+    """
+
+    def setUp(self):
+        self.media_root = use_temporary_media_root(self)
+        make_pdf(os.path.join(self.media_root, 'books', 'pdfs', 'sample.pdf'), 5)
+
+    def create_book(self, genre='fiksi'):
+        return Book.objects.create(
+            title='Sample', description='', author='Author', year=2000, genre=genre, pdf_file='books/pdfs/sample.pdf',
+        )
+
+    def ingest(self, genre='fiksi', **kwargs):
+        book = self.create_book(genre)
+        process_pdf_to_images(book, **kwargs)
+        book.refresh_from_db()
+        return book, list(book.pages.order_by('page_number'))
+
+    def assertImage(self, name, size, extension='webp'):
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)), name)
+        with Image.open(os.path.join(self.media_root, name)) as image:
+            self.assertEqual(image.size, size)
+        self.assertTrue(name.endswith('.' + extension))
+
+    def test_pages(self):
+        book, pages = self.ingest(workers=1)
+        self.assertEqual(book.page_count, 5)
+        self.assertEqual([page.page_number for page in pages], [1, 2, 3, 4, 5])
+        for page in pages:
+            name, digest = split_hashed_filename(page.image.name)
+            self.assertEqual(name, f'books/pages/book_{book.id}_page_{page.page_number}.webp')
+            self.assertIsNotNone(digest)
+            self.assertEqual((page.width, page.height), (300, 400))
+            self.assertImage(page.image.name, (300, 400))
+        self.assertEqual(split_hashed_filename(book.cover_image.name)[0], f'books/covers/cover_{book.id}.webp')
+        self.assertImage(book.cover_image.name, (300, 400))
+
+    def test_parallel_rendering_matches_serial(self):
+        _book, serial_pages = self.ingest(workers=1)
+        _book, parallel_pages = self.ingest(workers=2)
+        self.assertEqual(
+            [(page.page_number, split_hashed_filename(page.image.name)[1]) for page in parallel_pages],
+            [(page.page_number, split_hashed_filename(page.image.name)[1]) for page in serial_pages],
+        )
+
+    @override_settings(BOOK_PAGE_IMAGE_PROFILES={
+        'default': {'format': 'webp', 'quality': 80, 'dpi': 72},
+        'komik': {'format': 'jpeg', 'quality': 70, 'dpi': 144},
+    })
+    def test_genre_profile(self):
+        book, pages = self.ingest(genre='komik')
+        self.assertEqual(split_hashed_filename(pages[0].image.name)[0], f'books/pages/book_{book.id}_page_1.jpg')
+        self.assertEqual((pages[0].width, pages[0].height), (600, 800))
+        self.assertImage(pages[0].image.name, (600, 800), extension='jpg')
+        self.assertTrue(book.cover_image.name.endswith('.jpg'))
+
+    @override_settings(BOOK_PAGE_VARIANT_WIDTHS={'thumbnail': 100, 'same': 300, 'large': 450})
+    def test_variants(self):
+        book, pages = self.ingest()
+        for page in pages:
+            # A variant as wide as the main image is not rendered again.
+            self.assertEqual(set(page.variants), {'thumbnail', 'large'})
+            for name, size in [('thumbnail', (100, 133)), ('large', (450, 600))]:
+                variant = page.variants[name]
+                self.assertEqual(
+                    split_hashed_filename(variant['image'])[0],
+                    f'books/pages/book_{book.id}_page_{page.page_number}_{name}.webp',
+                )
+                self.assertEqual((variant['width'], variant['height']), size)
+                self.assertImage(variant['image'], size)
+        # The main image keeps the profile's DPI.
+        self.assertEqual((pages[0].width, pages[0].height), (300, 400))
+
+    @override_settings(BOOK_SPRITE_PAGES_PER_SHEET=3, BOOK_SPRITE_COLUMNS=2, BOOK_SPRITE_TILE_WIDTH=60)
+    def test_sprite_sheets(self):
+        book, _pages = self.ingest()
+        sheets = list(book.sprite_sheets.order_by('first_page'))
+        self.assertEqual([(sheet.first_page, sheet.last_page) for sheet in sheets], [(1, 3), (4, 5)])
+        self.assertEqual(split_hashed_filename(sheets[0].image.name)[0], f'books/sprites/book_{book.id}_sprite_1.webp')
+        self.assertEqual((sheets[0].tile_width, sheets[0].tile_height), (60, 80))
+        self.assertEqual(list(sheets[0].get_tiles()), [(1, 0, 0), (2, 60, 0), (3, 0, 80)])
+        self.assertEqual(list(sheets[1].get_tiles()), [(4, 0, 0), (5, 60, 0)])
+        self.assertImage(sheets[0].image.name, (120, 160))
+        self.assertImage(sheets[1].image.name, (120, 80))
+
+        with Image.open(os.path.join(self.media_root, sheets[0].image.name)) as image:
+            # Page 3 sits in the second row; the cell next to it is empty.
+            self.assertNotEqual(image.convert('L').crop((0, 80, 60, 160)).getextrema(), (255, 255))
+            self.assertGreater(image.convert('L').crop((62, 82, 118, 158)).getextrema()[0], 240)
+
+    @override_settings(BOOK_PAGE_VARIANT_WIDTHS={'thumbnail': 100})
+    def test_lazy_ingest_renders_only_the_cover(self):
+        book, pages = self.ingest(render_mode='lazy')
+        self.assertEqual([page.page_number for page in pages], [1, 2, 3, 4, 5])
+        self.assertFalse(any(page.image or page.variants for page in pages))
+        self.assertFalse(book.sprite_sheets.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'books', 'pages')))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'books', 'sprites')))
+        self.assertTrue(book.cover_image)
+
+        # The page grid builds the sheets on its first visit.
+        self.client.force_login(User.objects.create_user('reader', password='secret'))
+        response = self.client.get(reverse('books:page_grid', args=[book.id]))
+        self.assertEqual(len(response.context['tiles']), 5)
+        self.assertEqual(book.sprite_sheets.count(), 1)
+
+class AnalyzeBookViewTests(TestCase):
+    """
+    Analyzing a book stores its keywords without marking its text as
+    changed for the keyword model.
+    """
+
+    def setUp(self):
+        use_temporary_media_root(self)
+        make_pdf(os.path.join(settings.MEDIA_ROOT, 'books', 'pdfs', 'sample.pdf'), 1)
+        self.book = Book.objects.create(
+            title='Sample', description='', author='Author', year=2000, genre='fiksi', pdf_file='books/pdfs/sample.pdf',
+        )
+        self.client.force_login(User.objects.create_user('reader', password='secret'))
+
+    def test_keeps_updated_at(self):
+        version = get_catalog_version()
+        self.client.post(reverse('books:analyze', args=[self.book.id]))
+
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertTrue(book.keywords)
+        self.assertEqual(book.updated_at, self.book.updated_at)
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+@override_settings(BOOK_SIMILAR_BOOKS_COUNT=2)
+class SimilarBooksTests(TestCase):
+    """
+    The incremental rebuild settles: once the index is current nothing is
+    recomputed, including books with fewer neighbours than asked for.
+    """
+
+    def setUp(self):
+        # Two clusters and one book sharing no topic with the others.
+        self.books = [self.add_book(vector) for vector in ([1, 0, 0], [0.9, 0.1, 0], [0.8, 0.2, 0], [0, 1, 0], [0, 0, 1])]
+
+    def add_book(self, vector):
+        book = Book.objects.create(
+            title='Book', description='', author='Author', year=2000, genre='fiksi', pdf_file='books/pdfs/book.pdf',
+        )
+        BookTopicVector.objects.create(
+            book=book, vector=np.array(vector, dtype=np.float32).tobytes(), dominant_topic=int(np.argmax(vector)),
+        )
+        return book
+
+    def neighbours(self, book):
+        return list(SimilarBook.objects.filter(book=book).order_by('rank').values_list('similar_book_id', flat=True))
+
+    def test_second_run_recomputes_nothing(self):
+        self.assertEqual(update_similar_books(), 5)
+        self.assertEqual(self.neighbours(self.books[0]), [self.books[1].id, self.books[2].id])
+        # Fewer positive neighbours than BOOK_SIMILAR_BOOKS_COUNT.
+        self.assertEqual(self.neighbours(self.books[3]), [self.books[2].id, self.books[1].id])
+        self.assertEqual(self.neighbours(self.books[4]), [])
+
+        self.assertEqual(update_similar_books(), 0)
+
+    def test_deleted_neighbour(self):
+        update_similar_books()
+        self.books[1].delete()
+        # The lists that held the deleted book, and nothing else.
+        self.assertEqual(update_similar_books(), 3)
+        self.assertEqual(self.neighbours(self.books[0]), [self.books[2].id])
+        self.assertEqual(update_similar_books(), 0)
+
+    def test_new_book(self):
+        update_similar_books()
+        new_book = self.add_book([0, 0.1, 1])
+        self.assertGreater(update_similar_books(), 0)
+        self.assertEqual(self.neighbours(self.books[4]), [new_book.id])
+        self.assertEqual(update_similar_books(), 0)
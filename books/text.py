@@ -0,0 +1,122 @@
+"""
+Text normalization shared by keyword extraction and search.
+
+A ``TextPipeline`` holds the frozen stopword set of the configured languages
+(BOOK_TEXT_LANGUAGES) and precompiled regular expressions, so a text is
+lowercased, tokenized and filtered in a single pass without NLTK. Use
+``get_text_pipeline()`` to get the pipeline built once per process.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+
+STOP_WORDS = {
+    'english': frozenset({
+        'a', 'about', 'above', 'after', 'again', 'against', 'all', 'am', 'an', 'and',
+        'any', 'are', 'aren', 'as', 'at', 'be', 'because', 'been', 'before', 'being',
+        'below', 'between', 'both', 'but', 'by', 'can', 'couldn', 'did', 'didn', 'do',
+        'does', 'doesn', 'doing', 'don', 'down', 'during', 'each', 'few', 'for', 'from',
+        'further', 'had', 'hadn', 'has', 'hasn', 'have', 'haven', 'having', 'he', 'her',
+        'here', 'hers', 'herself', 'him', 'himself', 'his', 'how', 'i', 'if', 'in',
+        'into', 'is', 'isn', 'it', 'its', 'itself', 'just', 'll', 'me', 'mightn',
+        'more', 'most', 'mustn', 'my', 'myself', 'needn', 'no', 'nor', 'not', 'now',
+        'of', 'off', 'on', 'once', 'only', 'or', 'other', 'our', 'ours', 'ourselves',
+        'out', 'over', 'own', 're', 'same', 'shan', 'she', 'should', 'shouldn', 'so',
+        'some', 'such', 'than', 'that', 'the', 'their', 'theirs', 'them', 'themselves',
+        'then', 'there', 'these', 'they', 'this', 'those', 'through', 'to', 'too',
+        'under', 'until', 'up', 've', 'very', 'was', 'wasn', 'we', 'were', 'weren',
+        'what', 'when', 'where', 'which', 'while', 'who', 'whom', 'why', 'will', 'with',
+        'won', 'wouldn', 'you', 'your', 'yours', 'yourself', 'yourselves',
+    }),
+    'indonesian': frozenset({
+        'ada', 'adalah', 'adanya', 'agak', 'agar', 'akan', 'akhirnya', 'aku', 'amat',
+        'anda', 'antara', 'apa', 'apabila', 'apakah', 'apalagi', 'atas', 'atau', 'bagai',
+        'bagaimana', 'bagaimanapun', 'bagi', 'bahkan', 'bahwa', 'baik', 'banyak', 'baru',
+        'beberapa', 'begini', 'begitu', 'belum', 'benar', 'berapa', 'berbagai', 'beri',
+        'berikut', 'bersama', 'betapa', 'biasa', 'biasanya', 'bila', 'bisa', 'boleh',
+        'bukan', 'bukankah', 'cara', 'cukup', 'dahulu', 'dalam', 'dan', 'dapat', 'dari',
+        'daripada', 'demi', 'demikian', 'dengan', 'depan', 'di', 'dia', 'diri', 'dirinya',
+        'dua', 'dulu', 'empat', 'enam', 'guna', 'hal', 'hampir', 'hanya', 'harus',
+        'hingga', 'ia', 'ialah', 'ini', 'inilah', 'itu', 'itulah', 'jadi', 'jangan',
+        'jika', 'jikalau', 'juga', 'justru', 'kalau', 'kali', 'kalian', 'kami', 'kamu',
+        'kan', 'karena', 'kata', 'ke', 'kecil', 'kedua', 'kemudian', 'kenapa', 'kepada',
+        'ketika', 'kita', 'lagi', 'lain', 'lainnya', 'lalu', 'lama', 'lebih', 'lima',
+        'maka', 'makin', 'malah', 'mana', 'masih', 'masing', 'mau', 'maupun', 'melainkan',
+        'melalui', 'memang', 'mengapa', 'menjadi', 'menurut', 'mereka', 'merupakan',
+        'meski', 'meskipun', 'misalnya', 'mulai', 'mungkin', 'namun', 'nanti', 'oleh',
+        'pada', 'padahal', 'para', 'per', 'pernah', 'pula', 'pun', 'saat', 'saja',
+        'salah', 'sama', 'sambil', 'sampai', 'sang', 'sangat', 'satu', 'saya', 'se',
+        'sebab', 'sebagai', 'sebagian', 'sebelum', 'sebelumnya', 'sebuah', 'sedang',
+        'sedangkan', 'sedikit', 'segala', 'segera', 'sehingga', 'sejak', 'sekali',
+        'sekarang', 'selain', 'selalu', 'selama', 'seluruh', 'semakin', 'sembilan',
+        'semua', 'sendiri', 'seorang', 'sepanjang', 'seperti', 'sepuluh',
+        'sering', 'serta', 'sesuatu', 'sesudah', 'setelah', 'setiap', 'siapa', 'suatu',
+        'sudah', 'supaya', 'tadi', 'tak', 'tanpa', 'tapi', 'telah', 'tentang', 'tentu',
+        'tergantung', 'terhadap', 'terjadi', 'termasuk', 'ternyata', 'tersebut', 'tetap',
+        'tetapi', 'tiap', 'tidak', 'tiga', 'tujuh', 'untuk', 'walau', 'walaupun', 'ya',
+        'yaitu', 'yakni', 'yang', 'delapan', 'bab', 'halaman', 'bagian',
+    }),
+}
+
+# Words of the document structure that are never keywords in any language.
+DOCUMENT_STOP_WORDS = frozenset({
+    'chapter', 'page', 'book', 'text', 'content', 'section', 'part',
+})
+
+WORD_RE = re.compile(r'\w+')
+
+
+class TextPipeline:
+    """
+    Lowercase, tokenize and filter text in one pass.
+
+    ``terms()`` keeps the words that can be keywords: maximal runs of word
+    characters made only of letters, between ``min_length`` and
+    ``max_length`` characters long, that are not stopwords.
+    """
+
+    def __init__(self, languages=('english', 'indonesian'), extra_stop_words=(), min_length=4, max_length=19):
+        stop_words = set(DOCUMENT_STOP_WORDS)
+        stop_words.update(extra_stop_words)
+        for language in languages:
+            try:
+                stop_words.update(STOP_WORDS[language])
+            except KeyError:
+                raise ValueError(f'No stopwords for language: {language}')
+        self.languages = tuple(languages)
+        self.stop_words = frozenset(stop_words)
+        # Digits and underscores are word characters, so a word containing
+        # one has no word boundary next to its letters and does not match.
+        self.term_re = re.compile(rf'\b[^\W\d_]{{{min_length},{max_length}}}\b')
+
+    def words(self, text):
+        """
+        All lowercased words of the text, e.g. the terms of a search query.
+        """
+        return WORD_RE.findall(text.lower())
+
+    def terms(self, text):
+        stop_words = self.stop_words
+        return [term for term in self.term_re.findall(text.lower()) if term not in stop_words]
+
+    def count_terms(self, texts):
+        """
+        Count the terms of a stream of texts. Returns ``(term_counts,
+        word_total)`` where ``word_total`` counts every word.
+        """
+        term_counts = Counter()
+        word_total = 0
+        for text in texts:
+            word_total += len(WORD_RE.findall(text))
+            term_counts.update(self.terms(text))
+        return term_counts, word_total
+
+
+@lru_cache(maxsize=None)
+def get_text_pipeline():
+    """
+    The pipeline for BOOK_TEXT_LANGUAGES, built once per process.
+    """
+    return TextPipeline(getattr(settings, 'BOOK_TEXT_LANGUAGES', ('english', 'indonesian')))
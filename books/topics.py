@@ -0,0 +1,222 @@
+"""
+Offline topic modelling over the catalog.
+
+``python manage.py build_topics`` builds a sparse document-term matrix of all
+books, restricted to the vocabulary of the library-wide keyword model, fits
+an LDA model on it and stores:
+
+* one ``Topic`` per LDA component with its top terms and genre weights,
+* one ``BookTopicVector`` per book with its topic distribution as packed
+  float32 values and its dominant topic.
+
+The fitted model is kept at BOOK_TOPIC_MODEL_PATH so books added later can be
+given topic vectors without refitting (``build_topics --new-only``). Requests
+only read the stored rows.
+"""
+import os
+import pickle
+import tempfile
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from scipy import sparse
+
+from .catalog_cache import bump_catalog_version
+from .keyword_model import get_keyword_model, refresh_keyword_model
+from .models import Book, BookTopicVector, Topic
+from .utils import count_book_terms
+
+MODEL_VERSION = 1
+
+TOP_TERMS = 10
+
+
+def get_topic_settings():
+    return {
+        'topics': getattr(settings, 'BOOK_TOPIC_COUNT', 20),
+        'max_features': getattr(settings, 'BOOK_TOPIC_MAX_FEATURES', 10000),
+        'min_df': getattr(settings, 'BOOK_TOPIC_MIN_DF', 2),
+        'max_df': getattr(settings, 'BOOK_TOPIC_MAX_DF', 0.5),
+    }
+
+
+def get_model_path():
+    return str(getattr(settings, 'BOOK_TOPIC_MODEL_PATH', settings.BASE_DIR / 'cache' / 'topic_model.pickle'))
+
+
+def select_vocabulary(keyword_model, max_features, min_df, max_df):
+    """
+    Pick the topic vocabulary from the keyword model's document frequencies:
+    terms in at least ``min_df`` books and at most a ``max_df`` share of
+    them, the ``max_features`` most frequent first.
+    """
+    frequencies = keyword_model.document_frequencies
+    allowed = (frequencies >= min_df) & (frequencies <= max_df * keyword_model.document_total)
+    candidates = np.flatnonzero(allowed)
+    candidates = candidates[np.argsort(-frequencies[candidates], kind='stable')][:max_features]
+    return [keyword_model.terms[index] for index in sorted(candidates)]
+
+
+def build_document_term_matrix(books, vocabulary, progress_callback=None):
+    """
+    Count the vocabulary terms of every book into a CSR matrix with one row
+    per book. Returns ``(book_ids, genres, matrix)``.
+    """
+    columns = {term: index for index, term in enumerate(vocabulary)}
+    book_ids = []
+    genres = []
+    indptr = [0]
+    indices = []
+    data = []
+    for book in books.only('id', 'title', 'pdf_file', 'genre').order_by('id').iterator():
+        try:
+            term_counts = count_book_terms(book)
+        except Exception as e:
+            if progress_callback:
+                progress_callback(book, e)
+            continue
+        for term, count in term_counts.items():
+            index = columns.get(term)
+            if index is not None:
+                indices.append(index)
+                data.append(count)
+        indptr.append(len(indices))
+        book_ids.append(book.id)
+        genres.append(book.genre)
+        if progress_callback:
+            progress_callback(book, None)
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), indptr),
+        shape=(len(book_ids), len(vocabulary)),
+    )
+    return book_ids, genres, matrix
+
+
+def save_topic_model(vocabulary, lda):
+    path = get_model_path()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'version': MODEL_VERSION, 'vocabulary': vocabulary, 'lda': lda}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_topic_model():
+    """
+    Return ``(vocabulary, lda)`` of the stored model, or ``None``.
+    """
+    try:
+        with open(get_model_path(), 'rb') as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    if data.get('version') != MODEL_VERSION:
+        raise ValueError(f"Unsupported topic model version: {data.get('version')}")
+    return data['vocabulary'], data['lda']
+
+
+def make_topic_vectors(book_ids, doc_topics):
+    return [
+        BookTopicVector(
+            book_id=book_id,
+            vector=row.astype(np.float32).tobytes(),
+            dominant_topic=int(row.argmax()),
+        )
+        for book_id, row in zip(book_ids, doc_topics)
+    ]
+
+
+def update_topic_book_counts():
+    counts = dict(
+        BookTopicVector.objects.values_list('dominant_topic').annotate(count=Count('id')).order_by()
+    )
+    topics = list(Topic.objects.all())
+    for topic in topics:
+        topic.book_count = counts.get(topic.number, 0)
+    Topic.objects.bulk_update(topics, ['book_count'])
+
+
+def fit_topic_model(progress_callback=None):
+    """
+    Fit the LDA model over every book and replace the stored topics and
+    topic vectors. Returns the number of books with a topic vector.
+    """
+    from sklearn.decomposition import LatentDirichletAllocation
+
+    options = get_topic_settings()
+    keyword_model = get_keyword_model() or refresh_keyword_model()[0]
+    vocabulary = select_vocabulary(keyword_model, options['max_features'], options['min_df'], options['max_df'])
+    if not vocabulary:
+        raise ValueError('No terms shared by enough books to fit topics')
+
+    book_ids, genres, matrix = build_document_term_matrix(Book.objects.all(), vocabulary, progress_callback)
+    if not book_ids:
+        raise ValueError('No books to fit topics on')
+
+    lda = LatentDirichletAllocation(
+        n_components=options['topics'],
+        learning_method='online',
+        random_state=0,
+    )
+    doc_topics = lda.fit_transform(matrix)
+    save_topic_model(vocabulary, lda)
+
+    genre_choices = [choice for choice, _label in Book.GENRE_CHOICES]
+    genre_matrix = np.zeros((len(genre_choices), doc_topics.shape[1]))
+    for genre, row in zip(genres, doc_topics):
+        if genre in genre_choices:
+            genre_matrix[genre_choices.index(genre)] += row
+    genre_totals = genre_matrix.sum(axis=0)
+    genre_totals[genre_totals == 0] = 1
+    genre_shares = genre_matrix / genre_totals
+
+    topics = [
+        Topic(
+            number=number,
+            terms=[vocabulary[index] for index in np.argsort(-component)[:TOP_TERMS]],
+            genre_weights={genre: round(float(genre_shares[g, number]), 4) for g, genre in enumerate(genre_choices)},
+        )
+        for number, component in enumerate(lda.components_)
+    ]
+
+    with transaction.atomic():
+        Topic.objects.all().delete()
+        Topic.objects.bulk_create(topics)
+        BookTopicVector.objects.all().delete()
+        BookTopicVector.objects.bulk_create(make_topic_vectors(book_ids, doc_topics), batch_size=500)
+        update_topic_book_counts()
+    bump_catalog_version()
+    return len(book_ids)
+
+
+def infer_new_topics(progress_callback=None):
+    """
+    Give books without a topic vector one from the stored model. Returns the
+    number of books added, or ``None`` when no model has been fitted.
+    """
+    stored = load_topic_model()
+    if stored is None:
+        return None
+    vocabulary, lda = stored
+
+    books = Book.objects.filter(topic_vector__isnull=True)
+    book_ids, genres, matrix = build_document_term_matrix(books, vocabulary, progress_callback)
+    if not book_ids:
+        return 0
+
+    doc_topics = lda.transform(matrix)
+    with transaction.atomic():
+        BookTopicVector.objects.bulk_create(make_topic_vectors(book_ids, doc_topics), batch_size=500)
+        update_topic_book_counts()
+    bump_catalog_version()
+    return len(book_ids)
+
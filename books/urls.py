@@ -10,6 +10,15 @@ urlpatterns = [
     path('book/<int:book_id>/edit/', views.edit_book_view, name='edit'),
     path('book/<int:book_id>/delete/', views.delete_book_view, name='delete'),
     path('book/<int:book_id>/read/', views.read_book_view, name='read'),
+    path('book/<int:book_id>/read/pdf/', views.read_pdf_view, name='read_pdf'),
+    path('book/<int:book_id>/pdf/', views.book_pdf_view, name='pdf'),
+    path('book/<int:book_id>/pages/', views.page_grid_view, name='page_grid'),
+    path('book/<int:book_id>/manifest.json', views.page_manifest_view, name='page_manifest'),
+    path('book/<int:book_id>/page/<int:page_number>/image/', views.page_image_view, name='page_image'),
     path('book/<int:book_id>/toggle-favorite/', views.toggle_favorite_view, name='toggle_favorite'),
     path('book/<int:book_id>/analyze/', views.analyze_book_view, name='analyze'),
+    path('book/<int:book_id>/processing-status/', views.processing_status_view, name='processing_status'),
+    path('book/<int:book_id>/retry-processing/', views.retry_processing_view, name='retry_processing'),
+    path('topics/', views.topics_view, name='topics'),
+    path('topics/<int:number>/', views.topics_view, name='topic'),
 ]
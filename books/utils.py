@@ -1,157 +1,134 @@
-import fitz  # PyMuPDF
-import nltk
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
-import re
-import string
+"""
+Keyword extraction.
 
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')
+Texts are normalized with the shared ``TextPipeline`` (see ``books.text``);
+scoring uses the library-wide keyword model when it has been built.
+"""
+from collections import Counter
+import math
+from django.conf import settings
 
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from .models import BookPageText
+from .search import iter_page_texts
+from .text import get_text_pipeline
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+def get_keyword_model():
+    # keyword_model imports this module for the term counting.
+    from .keyword_model import get_keyword_model
+    return get_keyword_model()
 
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+def get_keyword_page_budget():
+    """
+    Maximum number of pages read for keyword analysis, from
+    BOOK_KEYWORD_MAX_PAGES. ``None`` analyzes the whole book.
+    """
+    return getattr(settings, 'BOOK_KEYWORD_MAX_PAGES', None)
 
-def analyze_book_keywords(book, max_keywords=10):
+def iter_book_texts(book, max_pages=None):
     """
-    Analyze book content and extract relevant keywords
+    Yield the text of the book's pages, from the texts stored by the search
+    index when the book has them and from the PDF otherwise.
     """
-    try:
-        pdf_path = book.pdf_file.path
-        doc = fitz.open(pdf_path)
-        
-        text_content = ""
-        max_pages = min(10, len(doc))
-        for page_num in range(max_pages):
-            page = doc[page_num]
-            page_text = page.get_text()
-            if page_text.strip():
-                text_content += page_text + " "
-        
-        doc.close()
-        
-        if not text_content.strip():
-            return ["Tidak ada teks ditemukan dalam PDF"]
-        
+    page_texts = BookPageText.objects.filter(book=book, page_number__gt=0)
+    if max_pages:
+        page_texts = page_texts.filter(page_number__lte=max_pages)
 
-        text_content = preprocess_text(text_content)
-        
-        if len(text_content.split()) < 10: 
-            return ["Teks terlalu pendek untuk dianalisis"]
-        
+    if page_texts.exists():
+        yield from page_texts.order_by('page_number').values_list('text', flat=True).iterator()
+    else:
+        for page_number, page_text in iter_page_texts(book.pdf_file.path, max_pages=max_pages):
+            yield page_text
 
-        keywords = extract_keywords_tfidf(text_content, max_keywords)
-        
-        return keywords if keywords else ["Tidak ditemukan kata kunci yang signifikan"]
+def count_page_terms(page_texts):
+    """
+    Count the candidate keywords of a stream of page texts. Returns
+    ``(term_counts, word_total)``.
+    """
+    return get_text_pipeline().count_terms(page_texts)
+
+def count_book_terms(book, max_pages=None):
+    if max_pages is None:
+        max_pages = get_keyword_page_budget()
+    term_counts, word_total = count_page_terms(iter_book_texts(book, max_pages))
+    return term_counts
+
+def extract_book_keywords(book, max_keywords=10, max_pages=None):
+    """
+    Extract the keywords of a book, or a message when it has too little
+    text. Errors are raised to the caller.
+
+    The text is streamed page by page and only the running term counts are
+    kept in memory, so the page budget can cover the whole book. Keywords are
+    scored with the library-wide model when it has been built.
+    """
+    if max_pages is None:
+        max_pages = get_keyword_page_budget()
+    
+    term_counts, word_total = count_page_terms(iter_book_texts(book, max_pages))
+    
+    if word_total == 0:
+        return ["Tidak ada teks ditemukan dalam PDF"]
+    
+    if word_total < 10:
+        return ["Teks terlalu pendek untuk dianalisis"]
+    
+    keywords = keywords_from_counts(term_counts, max_keywords, model=get_keyword_model())
+    
+    return keywords if keywords else ["Tidak ditemukan kata kunci yang signifikan"]
+
+def analyze_book_keywords(book, max_keywords=10, max_pages=None):
+    """
+    Analyze book content and extract relevant keywords
+    """
+    try:
+        return extract_book_keywords(book, max_keywords, max_pages)
     
     except Exception as e:
         return [f"Error analisis: {str(e)}"]
 
-def preprocess_text(text):
-    """
-    Clean and preprocess text for keyword extraction
+def keywords_from_counts(term_counts, max_keywords=10, model=None):
     """
+    Pick keywords from the term counts of a document.
 
-    text = text.lower()
+    With a library-wide ``KeywordModel`` the counts are scored with the IDF of
+    the whole catalog. Without one every term has the same IDF, so the TF-IDF
+    score is the L2-normalised term frequency.
+    """
+    filtered_total = sum(term_counts.values())
+    
+    if filtered_total < 5:
+        return ["Teks terlalu pendek untuk analisis"]
     
-    text = re.sub(r'[^\w\s]', ' ', text)
+    if model is not None:
+        return model.score(term_counts, max_keywords)
     
-    text = ' '.join(text.split())
+    if filtered_total < 20:
+        return [word for word, freq in term_counts.most_common(max_keywords)]
     
-    return text
+    top_terms = term_counts.most_common(min(200, filtered_total))
+    norm = math.sqrt(sum(freq * freq for _word, freq in top_terms))
+    
+    significant_keywords = [
+        keyword for keyword, freq in top_terms[:max_keywords * 2] 
+        if freq / norm > 0.01
+    ]
+    
+    return significant_keywords[:max_keywords]
 
 def extract_keywords_tfidf(text, max_keywords=10):
     """
-    Extract keywords using TF-IDF vectorization with fallback methods
+    Extract keywords using TF-IDF scoring with fallback methods
     """
     try:
-        try:
-            stop_words = set(stopwords.words('english'))
-        except:
-            stop_words = set()  
-        
-   
-        indonesian_stopwords = {
-            'dan', 'di', 'ke', 'dari', 'untuk', 'dengan', 'pada', 'dalam', 'yang', 'adalah',
-            'ini', 'itu', 'atau', 'juga', 'akan', 'telah', 'sudah', 'dapat', 'bisa', 'tidak',
-            'ada', 'satu', 'dua', 'tiga', 'empat', 'lima', 'enam', 'tujuh', 'delapan', 'sembilan',
-            'sepuluh', 'bab', 'halaman', 'bagian', 'seperti', 'karena', 'sehingga', 'namun',
-            'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-            'chapter', 'page', 'book', 'text', 'content', 'section', 'part'
-        }
-        stop_words.update(indonesian_stopwords)
-        
-        try:
-            words = word_tokenize(text.lower())
-        except Exception:
-            words = text.lower().split()
-        
-        filtered_words = [
-            word for word in words 
-            if word not in stop_words 
-            and len(word) > 3 
-            and not word.isdigit()
-            and word.isalpha()
-            and len(word) < 20
-        ]
-        
-        if len(filtered_words) < 5:
-            return ["Teks terlalu pendek untuk analisis"]
-        
-        if len(filtered_words) < 20:
-            from collections import Counter
-            word_freq = Counter(filtered_words)
-            most_common = word_freq.most_common(max_keywords)
-            return [word for word, freq in most_common]
-        
-        processed_text = ' '.join(filtered_words)
-        
-        try:
-            vectorizer = TfidfVectorizer(
-                max_features=min(200, len(filtered_words)),
-                ngram_range=(1, 1),
-                min_df=1,
-                max_df=1.0,
-                stop_words=None
-            )
-            
-            tfidf_matrix = vectorizer.fit_transform([processed_text])
-            feature_names = vectorizer.get_feature_names_out()
-            tfidf_scores = tfidf_matrix.toarray()[0]
-        except ValueError as e:
-            from collections import Counter
-            word_freq = Counter(filtered_words)
-            most_common = word_freq.most_common(max_keywords)
-            return [word for word, freq in most_common if freq > 1]
-        
-        keyword_scores = list(zip(feature_names, tfidf_scores))
-        keyword_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        significant_keywords = [
-            keyword for keyword, score in keyword_scores[:max_keywords * 2] 
-            if score > 0.01
-        ]
-        
-        final_keywords = significant_keywords[:max_keywords]
-        return final_keywords if final_keywords else ["Tidak ditemukan kata kunci yang signifikan"]
+        filtered_words = get_text_pipeline().terms(text)
+        keywords = keywords_from_counts(Counter(filtered_words), max_keywords, model=get_keyword_model())
+        return keywords if keywords else ["Tidak ditemukan kata kunci yang signifikan"]
     
     except Exception as e:
         try:
             words = text.lower().split()
             filtered_words = [word for word in words if len(word) > 3 and word.isalpha()]
             if filtered_words:
-                from collections import Counter
                 word_freq = Counter(filtered_words)
                 most_common = word_freq.most_common(min(max_keywords, 5))
                 return [word for word, freq in most_common]
@@ -2,52 +2,128 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-import fitz  
+from django.conf import settings
+from django.db.models import BooleanField, Case, Exists, IntegerField, OuterRef, Value, When
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, JsonResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import require_POST, require_safe
+import logging
 import os
-from PIL import Image
-import io
-from .models import Book, BookPage, Favorite
+from .models import Book, BookPage, BookRecommendation, BookTopicVector, Favorite, ProcessingJob, SimilarBook, Topic
+from .catalog_cache import bump_catalog_version, get_cache_timeout, get_catalog_version
+from .conditional import get_page_validators, not_modified, set_validators
+from .favorites import forget_favorite_book_ids, get_favorite_book_ids
 from .forms import BookUploadForm, BookEditForm, SearchForm
+from .jobs import enqueue_book_processing, retry_job
+from .media import file_response
+from .page_cache import get_cached_page, purge_book
+from .pagination import get_cached_count, paginate_keyset
+from .processing import rebuild_sprite_sheets
+from .search import search_books
+from .serializers import serialize_page_manifest
 from .utils import analyze_book_keywords
 
+logger = logging.getLogger(__name__)
+
+MANIFEST_MAX_AGE = 60 * 60 * 24
+
+CATALOG_PAGE_SIZE = 5
+
+def build_page_url(request, **params):
+    """
+    Query string for another catalog page, keeping the current filters.
+    """
+    query = request.GET.copy()
+    for key in ('page', 'after', 'before', 'last'):
+        query.pop(key, None)
+    for key, value in params.items():
+        query[key] = value
+    return '?' + query.urlencode()
+
 @login_required
 def catalog_view(request):
-    books = Book.objects.all().order_by('-created_at')
+    books = Book.objects.all()
     search_form = SearchForm()
     
     search_query = request.GET.get('search')
+    search_hits = {}
     if search_query:
-        books = books.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(year__icontains=search_query)
-        )
+        hits = search_books(search_query)
+        search_hits = {hit.book_id: hit for hit in hits}
+        if hits:
+            search_rank = Case(
+                *[When(id=hit.book_id, then=position) for position, hit in enumerate(hits)],
+                output_field=IntegerField(),
+            )
+            books = books.filter(id__in=search_hits).annotate(search_rank=search_rank).order_by('search_rank')
+        else:
+            books = books.none()
         search_form = SearchForm(initial={'query': search_query})
     
     favorites_filter = request.GET.get('favorites')
     if favorites_filter == '1':
-        favorite_book_ids = Favorite.objects.filter(user=request.user).values_list('book_id', flat=True)
-        books = books.filter(id__in=favorite_book_ids)
+        books = books.filter(id__in=get_favorite_book_ids(request)).annotate(
+            is_favorite=Value(True, output_field=BooleanField()),
+        )
+    else:
+        books = books.annotate(
+            is_favorite=Exists(Favorite.objects.filter(user=request.user, book=OuterRef('pk'))),
+        )
     
     genre_filter = request.GET.get('genre')
     if genre_filter:
         books = books.filter(genre=genre_filter)
     
-    paginator = Paginator(books, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if search_query:
+        # Search results are ranked and capped by the search backend, so
+        # plain page numbers stay cheap.
+        paginator = Paginator(books, CATALOG_PAGE_SIZE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_links = {
+            'first': build_page_url(request, page=1),
+            'previous': build_page_url(request, page=page_obj.previous_page_number()) if page_obj.has_previous() else None,
+            'next': build_page_url(request, page=page_obj.next_page_number()) if page_obj.has_next() else None,
+            'last': build_page_url(request, page=paginator.num_pages),
+        }
+        page_info = {'number': page_obj.number, 'num_pages': paginator.num_pages}
+    else:
+        count_key = [genre_filter or '', request.user.id if favorites_filter == '1' else '']
+        count = get_cached_count(books, count_key)
+        try:
+            number = int(request.GET.get('page', 1))
+        except ValueError:
+            number = 1
+        page_obj = paginate_keyset(
+            books,
+            CATALOG_PAGE_SIZE,
+            count,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            last=request.GET.get('last') == '1',
+            number=number,
+        )
+        page_links = {
+            'first': build_page_url(request),
+            'previous': build_page_url(request, before=page_obj.previous_cursor, page=page_obj.number - 1) if page_obj.has_previous else None,
+            'next': build_page_url(request, after=page_obj.next_cursor, page=page_obj.number + 1) if page_obj.has_next else None,
+            'last': build_page_url(request, last=1),
+        }
+        page_info = {'number': page_obj.number, 'num_pages': page_obj.num_pages}
     
-    user_favorites = set()
-    if request.user.is_authenticated:
-        user_favorites = set(Favorite.objects.filter(user=request.user).values_list('book_id', flat=True))
+    for book in page_obj:
+        book.search_hit = search_hits.get(book.id)
     
     context = {
         'page_obj': page_obj,
+        'page_links': page_links,
+        'page_info': page_info,
         'search_form': search_form,
-        'user_favorites': user_favorites,
+        'catalog_version': get_catalog_version(),
+        'cache_timeout': get_cache_timeout(),
         'current_filter': {
             'search': search_query,
             'favorites': favorites_filter,
@@ -57,17 +133,59 @@ def catalog_view(request):
     
     return render(request, 'books/catalog.html', context)
 
+def get_topic_info(book):
+    """
+    The dominant topic of the book and the genre its topics suggest, when
+    it differs from the book's genre.
+    """
+    info = {'topic': None, 'suggested_genre': None}
+    try:
+        topic_vector = book.topic_vector
+    except BookTopicVector.DoesNotExist:
+        return info
+    topics = list(Topic.objects.all())
+    info['topic'] = next((item for item in topics if item.number == topic_vector.dominant_topic), None)
+    genre = topic_vector.suggest_genre(topics)
+    if genre and genre != book.genre:
+        info['suggested_genre'] = dict(Book.GENRE_CHOICES).get(genre)
+    return info
+
 @login_required
 def book_detail_view(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
+    book = get_object_or_404(Book.objects.select_related('topic_vector'), id=book_id)
     is_favorite = Favorite.objects.filter(user=request.user, book=book).exists()
+    processing_job = book.latest_processing_job()
+    
+    job_state = (processing_job.pk, processing_job.status, processing_job.processed_pages) if processing_job else None
+    validators = get_page_validators(request, book, is_favorite, job_state)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    
+    # The book's details and panels are cached fragments of the template;
+    # these are only evaluated when a fragment has to be rendered again.
+    topic_info = SimpleLazyObject(lambda: get_topic_info(book))
+    similar_books = SimpleLazyObject(lambda: [
+        entry.similar_book
+        for entry in SimilarBook.objects.filter(book=book).select_related('similar_book').order_by('rank')
+    ])
+    also_liked_books = SimpleLazyObject(lambda: [
+        entry.recommended_book
+        for entry in BookRecommendation.objects.filter(book=book).select_related('recommended_book').order_by('rank')
+    ])
     
     context = {
         'book': book,
         'is_favorite': is_favorite,
+        'processing_job': processing_job,
+        'topic_info': topic_info,
+        'similar_books': similar_books,
+        'also_liked_books': also_liked_books,
+        'catalog_version': get_catalog_version(),
+        'cache_timeout': get_cache_timeout(),
     }
     
-    return render(request, 'books/detail.html', context)
+    return set_validators(render(request, 'books/detail.html', context), validators)
 
 @login_required
 def upload_book_view(request):
@@ -75,14 +193,9 @@ def upload_book_view(request):
         form = BookUploadForm(request.POST, request.FILES)
         if form.is_valid():
             book = form.save()
-            
-            try:
-                process_pdf_to_images(book)
-                messages.success(request, 'Buku berhasil diupload!')
-                return redirect('books:detail', book_id=book.id)
-            except Exception as e:
-                book.delete()
-                messages.error(request, f'Gagal memproses PDF: {str(e)}')
+            enqueue_book_processing(book)
+            messages.success(request, 'Buku berhasil diupload! Halaman buku sedang diproses.')
+            return redirect('books:detail', book_id=book.id)
     else:
         form = BookUploadForm()
     
@@ -98,12 +211,9 @@ def edit_book_view(request, book_id):
             updated_book = form.save()
             
             if 'pdf_file' in request.FILES:
-                BookPage.objects.filter(book=book).delete()
-                try:
-                    process_pdf_to_images(updated_book)
-                except Exception as e:
-                    messages.error(request, f'Gagal memproses PDF: {str(e)}')
-                    return redirect('books:edit', book_id=book.id)
+                # The old pages stay readable until the ingest swaps in the
+                # new ones and deletes the old files.
+                enqueue_book_processing(updated_book)
             
             messages.success(request, 'Buku berhasil diperbarui!')
             return redirect('books:detail', book_id=book.id)
@@ -126,8 +236,14 @@ def delete_book_view(request, book_id):
                 os.remove(book.cover_image.path)
         
         for page in book.pages.all():
-            if os.path.exists(page.image.path):
-                os.remove(page.image.path)
+            for name in page.get_image_names():
+                path = os.path.join(settings.MEDIA_ROOT, name)
+                if os.path.exists(path):
+                    os.remove(path)
+        for sheet in book.sprite_sheets.all():
+            if os.path.exists(sheet.image.path):
+                os.remove(sheet.image.path)
+        purge_book(book.id)
         
         book.delete()
         messages.success(request, 'Buku berhasil dihapus!')
@@ -140,21 +256,144 @@ def read_book_view(request, book_id):
     book = get_object_or_404(Book, id=book_id)
     page_number = int(request.GET.get('page', 1))
     
-    pages = book.pages.all()
-    if not pages:
-        messages.error(request, 'Halaman buku tidak ditemukan.')
+    current_page = BookPage.objects.filter(book=book, page_number=page_number).first()
+    if current_page is None:
+        if book.pages.exists():
+            raise Http404('Halaman tidak ditemukan.')
+        job = book.latest_processing_job()
+        if job and job.is_active:
+            messages.warning(request, 'Halaman buku masih diproses. Silakan coba lagi nanti.')
+        else:
+            messages.error(request, 'Halaman buku tidak ditemukan.')
         return redirect('books:detail', book_id=book.id)
     
-    current_page = get_object_or_404(BookPage, book=book, page_number=page_number)
+    validators = get_page_validators(request, book, current_page.pk)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
     
     context = {
         'book': book,
         'current_page': current_page,
-        'total_pages': pages.count(),
+        'total_pages': book.page_count,
+        'page_number': page_number,
+    }
+    
+    return set_validators(render(request, 'books/read.html', context), validators)
+
+@login_required
+def read_pdf_view(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+    if not book.pdf_file:
+        raise Http404('File PDF tidak ditemukan.')
+    try:
+        page_number = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page_number = 1
+    
+    # The page number is handled client-side, so it is not part of the ETag.
+    validators = get_page_validators(request, book)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    
+    context = {
+        'book': book,
         'page_number': page_number,
     }
     
-    return render(request, 'books/read.html', context)
+    return set_validators(render(request, 'books/read_pdf.html', context), validators)
+
+@login_required
+@require_safe
+def book_pdf_view(request, book_id):
+    """
+    The book's PDF, with range request support for the PDF reader.
+    """
+    book = get_object_or_404(Book, id=book_id)
+    if not book.pdf_file:
+        raise Http404('File PDF tidak ditemukan.')
+    response = file_response(request, book.pdf_file.path, private=True)
+    response['Content-Disposition'] = content_disposition_header(False, os.path.basename(book.pdf_file.name))
+    return response
+
+@login_required
+def page_manifest_view(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+    response = JsonResponse(serialize_page_manifest(book))
+    # The reader requests the manifest with ?v=<version>, so a new version
+    # gets a new URL and the cached copy can be kept for a long time.
+    patch_cache_control(response, private=True, max_age=MANIFEST_MAX_AGE)
+    return response
+
+@login_required
+def page_grid_view(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+    sprite_sheets = list(book.sprite_sheets.all())
+    if not sprite_sheets and book.page_count:
+        # Lazily ingested books get their sheets on the first visit.
+        try:
+            rebuild_sprite_sheets(book)
+            sprite_sheets = list(book.sprite_sheets.all())
+        except (RuntimeError, ValueError, OSError):
+            logger.exception('Could not build the sprite sheets of book %s', book.id)
+    
+    # Sheet names carry a hash of their content.
+    validators = get_page_validators(request, book, *(sheet.image.name for sheet in sprite_sheets))
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    
+    tiles = []
+    for sheet in sprite_sheets:
+        sheet_url = sheet.image.url
+        for page_number, x, y in sheet.get_tiles():
+            tiles.append({
+                'page_number': page_number,
+                'sheet_url': sheet_url,
+                'x': x,
+                'y': y,
+                'width': sheet.tile_width,
+                'height': sheet.tile_height,
+            })
+    
+    context = {
+        'book': book,
+        'tiles': tiles,
+        'page_numbers': range(1, book.page_count + 1),
+    }
+    
+    return set_validators(render(request, 'books/page_grid.html', context), validators)
+
+@login_required
+def page_image_view(request, book_id, page_number):
+    book = get_object_or_404(Book, id=book_id)
+    page = get_object_or_404(BookPage, book=book, page_number=page_number)
+    
+    if page.image:
+        path = page.image.path
+    else:
+        try:
+            path = get_cached_page(book, page_number)
+        except (IndexError, ValueError, RuntimeError):
+            raise Http404('Halaman tidak dapat dirender.')
+    
+    return file_response(request, path, private=True)
+
+@login_required
+@require_safe
+def media_view(request, path):
+    """
+    Files under MEDIA_ROOT for signed-in users, with caching headers (see
+    ``books.media``).
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('File tidak ditemukan.')
+    if not os.path.isfile(full_path):
+        raise Http404('File tidak ditemukan.')
+    return file_response(request, full_path, private=True)
 
 @login_required
 @require_POST
@@ -167,6 +406,7 @@ def toggle_favorite_view(request, book_id):
         is_favorite = False
     else:
         is_favorite = True
+    forget_favorite_book_ids(request)
     
     return JsonResponse({'is_favorite': is_favorite})
 
@@ -176,49 +416,64 @@ def analyze_book_view(request, book_id):
     
     try:
         keywords = analyze_book_keywords(book)
-        book.keywords = ', '.join(keywords)
-        book.save()
+        # An update leaves updated_at alone, which the keyword model reads
+        # as the book's text having changed.
+        Book.objects.filter(pk=book.pk).update(keywords=', '.join(keywords))
+        bump_catalog_version()
         messages.success(request, 'Analisis kata kunci berhasil!')
     except Exception as e:
         messages.error(request, f'Gagal menganalisis buku: {str(e)}')
     
     return redirect('books:detail', book_id=book.id)
 
-def process_pdf_to_images(book):
-    pdf_path = book.pdf_file.path
-    doc = fitz.open(pdf_path)
+@login_required
+def processing_status_view(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+    job = book.latest_processing_job()
     
-    first_page = doc[0]
-    pix = first_page.get_pixmap()
-    img_data = pix.tobytes("png")
+    if job is None:
+        return JsonResponse({'status': None, 'page_count': book.page_count})
     
-    cover_filename = f"cover_{book.id}.png"
-    cover_path = os.path.join('media/books/covers/', cover_filename)
-    os.makedirs(os.path.dirname(cover_path), exist_ok=True)
+    return JsonResponse({
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'processed_pages': job.processed_pages,
+        'total_pages': job.total_pages,
+        'progress': job.progress_percent,
+        'attempts': job.attempts,
+        'error': job.error,
+        'page_count': book.page_count,
+    })
+
+@login_required
+@require_POST
+def retry_processing_view(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+    job = book.latest_processing_job()
     
-    with open(cover_path, 'wb') as f:
-        f.write(img_data)
+    if job and job.status == ProcessingJob.STATUS_FAILED:
+        retry_job(job)
+    elif job is None or not job.is_active:
+        enqueue_book_processing(book)
     
-    book.cover_image = f'books/covers/{cover_filename}'
-    book.page_count = len(doc)
-    book.save()
+    messages.success(request, 'Buku dimasukkan kembali ke antrean pemrosesan.')
+    return redirect('books:detail', book_id=book.id)
+
+@login_required
+def topics_view(request, number=None):
+    topics = Topic.objects.all()
+    topic = None
+    page_obj = None
+    if number is not None:
+        topic = get_object_or_404(Topic, number=number)
+        books = Book.objects.filter(topic_vector__dominant_topic=number).order_by('-created_at')
+        paginator = Paginator(books, 10)
+        page_obj = paginator.get_page(request.GET.get('page'))
     
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        pix = page.get_pixmap()
-        img_data = pix.tobytes("png")
-        
-        page_filename = f"book_{book.id}_page_{page_num + 1}.png"
-        page_path = os.path.join('media/books/pages/', page_filename)
-        os.makedirs(os.path.dirname(page_path), exist_ok=True)
-        
-        with open(page_path, 'wb') as f:
-            f.write(img_data)
-        
-        BookPage.objects.create(
-            book=book,
-            page_number=page_num + 1,
-            image=f'books/pages/{page_filename}'
-        )
+    context = {
+        'topics': topics,
+        'topic': topic,
+        'page_obj': page_obj,
+    }
     
-    doc.close()
+    return render(request, 'books/topics.html', context)
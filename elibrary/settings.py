@@ -124,6 +124,103 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Background PDF processing (run the worker with `python manage.py process_books`)
+BOOK_PROCESSING_MAX_ATTEMPTS = 3
+BOOK_PROCESSING_POLL_INTERVAL = 2
+BOOK_PROCESSING_STALE_AFTER = 30 * 60
+# Processes used to render the pages of one PDF (None = one per CPU core)
+BOOK_RENDER_WORKERS = None
+# Rows per INSERT when BookPage rows are written with bulk_create
+BOOK_PAGE_BULK_BATCH_SIZE = 500
+# Codec ('webp', 'jpeg' or 'png'), quality and DPI of rendered page images per
+# genre; 'default' applies to genres without their own profile. Re-encode the
+# existing library with `python manage.py reencode_pages`.
+BOOK_PAGE_IMAGE_PROFILES = {
+    'default': {'format': 'webp', 'quality': 80, 'dpi': 120},
+    'fiksi': {'format': 'webp', 'quality': 80, 'dpi': 144},
+    'motivasi': {'format': 'webp', 'quality': 80, 'dpi': 144},
+    'komik': {'format': 'webp', 'quality': 72, 'dpi': 110},
+}
+# Extra page widths (in pixels) rendered at ingest and offered to the reader
+# through srcset. A width equal to the full image width is skipped.
+BOOK_PAGE_VARIANT_WIDTHS = {
+    'thumbnail': 240,
+    'mobile': 720,
+    'desktop': 1280,
+    'retina': 1920,
+}
+# Thumbnail sprite sheets for the page grid: pages per sheet, grid columns and
+# thumbnail width in pixels
+BOOK_SPRITE_PAGES_PER_SHEET = 60
+BOOK_SPRITE_COLUMNS = 10
+BOOK_SPRITE_TILE_WIDTH = 120
+# Rewrite uploaded PDFs linearized ("fast web view") at ingest, so the PDF
+# reader shows the first page before the whole file is downloaded. Existing
+# books: `python manage.py linearize_pdfs`.
+BOOK_PDF_LINEARIZE = True
+
+# Full-text search over extracted PDF text. SQLiteFTS5Backend falls back to
+# books.search.DatabaseSearchBackend on databases without the FTS5 index.
+# Index books ingested earlier with `python manage.py rebuild_search_index`.
+BOOK_SEARCH_BACKEND = 'books.search.SQLiteFTS5Backend'
+# Pages read for keyword analysis; the text is streamed page by page, so None
+# (the whole book) keeps memory bounded as well.
+BOOK_KEYWORD_MAX_PAGES = None
+# Stopword languages of the text pipeline shared by keyword extraction and
+# search (see books.text.STOP_WORDS)
+BOOK_TEXT_LANGUAGES = ['english', 'indonesian']
+# Library-wide TF-IDF model used to score keywords, built and refreshed with
+# `python manage.py build_keyword_model`. A full refit happens once changed or
+# deleted books exceed BOOK_KEYWORD_MODEL_REFIT_RATIO of the model.
+BOOK_KEYWORD_MODEL_PATH = BASE_DIR / 'cache' / 'keyword_model.pickle'
+BOOK_KEYWORD_MODEL_REFIT_RATIO = 0.2
+# LDA topic model fitted offline with `python manage.py build_topics` over the
+# keyword model's terms found in at least BOOK_TOPIC_MIN_DF books and at most
+# BOOK_TOPIC_MAX_DF of them
+BOOK_TOPIC_COUNT = 20
+BOOK_TOPIC_MAX_FEATURES = 10000
+BOOK_TOPIC_MIN_DF = 2
+BOOK_TOPIC_MAX_DF = 0.5
+BOOK_TOPIC_MODEL_PATH = BASE_DIR / 'cache' / 'topic_model.pickle'
+# Neighbours per book in the "similar books" index, updated from the topic
+# vectors by build_topics or `python manage.py build_similar_books`
+BOOK_SIMILAR_BOOKS_COUNT = 6
+# "Readers who liked this also liked", rebuilt from favorites with
+# `python manage.py build_recommendations`; pairs of books need at least
+# BOOK_RECOMMENDATIONS_MIN_CO_FAVORITES users favoriting both
+BOOK_RECOMMENDATIONS_COUNT = 6
+BOOK_RECOMMENDATIONS_MIN_CO_FAVORITES = 2
+# 'eager' renders every page at upload, 'lazy' renders pages on first read into
+# a size-bounded LRU cache under MEDIA_ROOT/BOOK_PAGE_CACHE_DIR and the page
+# grid's sprite sheets on its first visit (or `python manage.py build_sprites`)
+BOOK_PAGE_RENDER_MODE = 'eager'
+BOOK_PAGE_CACHE_DIR = 'cache/pages'
+BOOK_PAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Files under MEDIA_URL are only served to signed-in users. Django checks the
+# session and leaves the transfer to the front web server: 'x-accel-redirect'
+# (nginx, with an internal location BOOK_MEDIA_ACCEL_PREFIX aliased to
+# MEDIA_ROOT) or 'x-sendfile' (Apache mod_xsendfile, lighttpd). None streams
+# the files from Django, e.g. with runserver.
+BOOK_MEDIA_SENDFILE = None
+BOOK_MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Seconds rendered catalog rows, book detail fragments and catalog totals are
+# cached. Keys carry a catalog version bumped whenever a book is saved or
+# deleted (see books.catalog_cache), so entries never go stale before that.
+BOOK_CATALOG_CACHE_SECONDS = 60 * 60 * 24
+
+# File based, so the version bumped by the job worker or a management command
+# is seen by every web worker process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'django',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/books/catalog/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'